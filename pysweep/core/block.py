@@ -2,28 +2,72 @@
 import numpy,mpi4py.MPI as MPI,ctypes,os
 import pysweep.core.geometry as geometry
 import pysweep.core.io as io
-from itertools import product
+import pysweep.core.process as process
+import pysweep.core.functions as functions
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 try:
     import pycuda.driver as cuda
 except Exception as e:
     pass
 
+def loadInitialConditions(solver,ops=0):
+    """Use this function to read the initial conditions of a node into the shared array once, each rank of the node reads its own rows, copies them to the intermediate levels, and writes them out.
+    ops is the width of the standard halo, the periodic y halo is filled from the same rows.
+    """
+    iv,ix,iy = solver.globalBlock
+    width = iy.stop-iy.start
+    start,stop = io.getNodeRankRows(solver)
+    rows = slice(start+ops,stop+ops,1)
+    slab = numpy.asarray(solver.initialConditions[iv,ix.start+start:ix.start+stop,iy]) if stop > start else numpy.zeros((solver.sharedShape[1],0,iy.stop-iy.start),dtype=solver.dtype)
+    if ops:
+        solver.sharedArray[0,:,rows,ops:-ops] = slab
+        solver.sharedArray[0,:,rows,:ops] = slab[:,:,-ops-1:-1]
+        solver.sharedArray[0,:,rows,-ops:] = slab[:,:,1:ops+1]
+    else:
+        solver.sharedArray[0,:,rows,:width] = slab
+    for i in range(1,solver.intermediate):
+        solver.sharedArray[i,:,rows,:] = solver.sharedArray[0,:,rows,:]
+    io.writeInitialConditions(solver,slab,start,stop)
+    solver.nodeComm.Barrier()
+    level = solver.sharedArray[0,:,ops:solver.sharedShape[2]-ops,ops:ops+width]
+    if solver.simulation:
+        io.recordDiagnostics(solver,0,level) #The standard solver records the first level when it writes it
+    if solver.shardedOutput and solver.nodeMasterBool:
+        io.writeOutput(solver,0,level)
+
 def createCPUSharedArray(solver,arrayBytes):
     """Use this function to create shared memory arrays for node communication."""
     itemsize = int(solver.dtype.itemsize)
     #Creating MPI Window for shared memory
-    win = MPI.Win.Allocate_shared(arrayBytes, itemsize, comm=solver.nodeComm)
+    solver.win = win = MPI.Win.Allocate_shared(arrayBytes, itemsize, comm=solver.nodeComm)
     sharedBuffer, itemsize = win.Shared_query(0)
     solver.sharedArray = numpy.ndarray(buffer=sharedBuffer, dtype=solver.dtype.type, shape=solver.sharedShape)
 
+def createBlockCounter(solver,phases):
+    """Use this function to create the counter in shared memory that the ranks of a node claim cpu blocks from with work stealing and set it on the phases."""
+    solver.counterWin = None
+    counter = None
+    if solver.workStealing:
+        itemsize = numpy.dtype(numpy.int64).itemsize
+        solver.counterWin = MPI.Win.Allocate_shared(itemsize if solver.nodeMasterBool else 0,itemsize,comm=solver.nodeComm)
+        counterBuffer, itemsize = solver.counterWin.Shared_query(0)
+        if solver.nodeMasterBool:
+            numpy.ndarray(buffer=counterBuffer,dtype=numpy.int64,shape=(1,))[0] = 0
+        solver.nodeComm.Barrier() #Counter is zeroed before it is claimed from
+        solver.counterWin.Lock_all()
+        counter = geometry.BlockCounter(solver.counterWin,max(solver.threads,1),solver.nodeComm.Get_size())
+    for phase in phases:
+        phase.setCounter(counter)
+
 #-----------------------------Swept functions----------------------------------------#
 
 def sweptBlock(solver):
     """This is the entry point for the swept portion of the block module."""
     #Create and fill shared array
     createCPUSharedArray(solver,numpy.zeros(solver.sharedShape,dtype=solver.dtype).nbytes)
-    for i in range(solver.intermediate):
-        solver.sharedArray[i,:,:,:] =  solver.initialConditions[solver.globalBlock]
+    if not solver.restart:
+        loadInitialConditions(solver) #Restarted runs are loaded from the checkpoint
     #Create phase objects
     solver.Up = geometry.Geometry() 
     solver.Down = geometry.Geometry() 
@@ -39,6 +83,7 @@ def sweptBlock(solver):
         setupGPUSwept(solver)
     #Setting up CPU
     setupCPUSwept(solver)
+    functions.setTimeBase(solver,0)
     solver.comm.Barrier() #Ensure all processes are
 
 
@@ -46,13 +91,12 @@ def setupCPUSwept(solver):
     """Use this function to execute core cpu only proceysses"""
     timeSlice = slice(0,solver.sharedShape[0],1)
     solver.blocks = [(timeSlice,)+tuple(block) for block in solver.blocks]
-    solver.edgeblocks = makeEdgeBlocksSwept(solver.blocks,solver.arrayShape,solver.blocksize)
+    solver.edgeblocks = makeEdgeBlocksSwept(solver.blocks,solver.sharedShape,solver.blocksize) #Edge blocks of nodes split in y reach into the y halo
+    solver.shiftedBlocks = [shiftBlockX(block,solver.splitx,solver.sharedShape[2]) for block in solver.blocks]
+    solver.shiftedEdgeblocks = [shiftBlockX(block,solver.splitx,solver.sharedShape[2]) for block in solver.edgeblocks]
     solver.cpu.set_globals(*solver.globals)
     #Creating sets for cpu calculation
-    up_sets = createUpPyramidSets(solver.blocksize,solver.operating)
-    down_sets = createDownPyramidSets(solver.blocksize,solver.operating)
-    oct_sets = down_sets+up_sets
-    y_sets,x_sets = createBridgeSets(solver.blocksize,solver.operating,solver.maxPyramidSize)
+    up_sets,down_sets,oct_sets,y_sets,x_sets = createSweptSets(tuple(solver.blocksize),solver.operating,solver.maxPyramidSize)
     cshape = solver.sharedArray[solver.blocks[0]].shape  if solver.blocks else (0,)
     #Initializing CPU portion of Geometry
     solver.Up.initializeCPU(solver.cpu,up_sets,solver.intermediate-1,cshape) 
@@ -60,6 +104,11 @@ def setupCPUSwept(solver):
     solver.Xb.initializeCPU(solver.cpu,x_sets,solver.intermediate-1,cshape)
     solver.Yb.initializeCPU(solver.cpu,y_sets,solver.intermediate-1,cshape)
     solver.Oct.initializeCPU(solver.cpu,oct_sets,solver.intermediate-1,cshape)
+    createThreadPool(solver)
+    for phase in (solver.Up,solver.Down,solver.Xb,solver.Yb,solver.Oct):
+        phase.setInPlace(solver.inPlace)
+        phase.setPool(solver.pool)
+    createBlockCounter(solver,(solver.Up,solver.Down,solver.Xb,solver.Yb,solver.Oct))
 
 def getGPUReadBlockSwept(solver):
     """Use this function to create the GPU read block."""
@@ -75,6 +124,8 @@ def setupGPUSwept(solver):
     """Use this function to execute core gpu only processes"""
     solver.gpuBlock = (slice(0,solver.sharedShape[0],1),)+solver.gpuBlock
     getGPUReadBlockSwept(solver) #Finish creating gpuReadBlock here
+    solver.shiftedGPUBlock = shiftBlockX(solver.gpuBlock,solver.splitx,solver.sharedShape[2])
+    solver.shiftedGPUReadBlock = shiftBlockX(solver.gpuReadBlock,solver.splitx,solver.sharedShape[2])
     blockShape =[element.stop for element in solver.gpuBlock]
     blockShape[-1] += int(2*solver.blocksize[0]) #Adding 2 blocks in the column direction
     # Creating local GPU array with split
@@ -103,6 +154,18 @@ def mallocGPUArray(blockShape):
     arr = numpy.ascontiguousarray(arr)
     return cuda.mem_alloc(arr.nbytes)
 
+def shiftBlockX(block,shift,nx):
+    """Use this function to get a block moved back by shift rows on the x ring of nx rows of the shared array.
+    Blocks that wrap around the ring use an index array, shaped for outer indexing if the y index is also an array.
+    """
+    timeSlice,variableSlice,xIndex,yIndex = block
+    if xIndex.start-shift >= 0:
+        return (timeSlice,variableSlice,slice(xIndex.start-shift,xIndex.stop-shift,1),yIndex)
+    xIndex = numpy.arange(xIndex.start-shift,xIndex.stop-shift)%nx
+    if not isinstance(yIndex,slice):
+        xIndex = xIndex[:,None]
+    return (timeSlice,variableSlice,xIndex,yIndex)
+
 def makeEdgeBlocksSwept(cpuBlocks,sharedShape,blocksize):
     """Use this function to create shift blocks and edge blocks."""
     #This handles edge blocks in the y direction
@@ -120,18 +183,29 @@ def makeEdgeBlocksSwept(cpuBlocks,sharedShape,blocksize):
     return shiftBlocks
 
 
+@lru_cache(maxsize=None)
+def createSweptSets(blocksize,operating,MPSS):
+    """Use this function to get all swept sets, they are memoized per (blocksize,operating,MPSS) and shared between geometries."""
+    up_sets = createUpPyramidSets(blocksize,operating)
+    down_sets = createDownPyramidSets(blocksize,operating)
+    y_sets,x_sets = createBridgeSets(blocksize,operating,MPSS)
+    return up_sets,down_sets,down_sets+up_sets,y_sets,x_sets
+
+@lru_cache(maxsize=None)
 def createUpPyramidSets(blocksize,operating):
-    """This function creates up sets for the dsweep."""
+    """This function creates up sets for the dsweep.
+    Each set is a region, i.e., a tuple of x and y slices.
+    """
     sets = tuple()
     ul = blocksize[0]-operating
     dl = operating
     while ul > dl:
-        r = numpy.arange(dl,ul,1)
-        sets+=(tuple(product(r,r)),)
+        sets+=((slice(dl,ul,1),slice(dl,ul,1)),)
         dl+=operating
         ul-=operating
     return sets
 
+@lru_cache(maxsize=None)
 def createDownPyramidSets(blocksize,operating):
     """Use this function to create the down pyramid sets from up sets."""
     bsx = int(blocksize[0]/2)
@@ -140,14 +214,14 @@ def createDownPyramidSets(blocksize,operating):
     ul = int((bsy)+operating); #upper y
     sets = tuple()
     while dl > 0:
-        r = numpy.arange(dl,ul,1)
-        sets+=(tuple(product(r,r)),)
+        sets+=((slice(dl,ul,1),slice(dl,ul,1)),)
         dl-=operating
         ul+=operating
     return sets
 
+@lru_cache(maxsize=None)
 def createBridgeSets(blocksize,operating,MPSS):
-    """Use this function to create the iidx sets for bridges."""
+    """Use this function to create the region sets for bridges."""
     sets = tuple()
     xul = blocksize[0]-operating
     xdl = operating
@@ -156,7 +230,7 @@ def createBridgeSets(blocksize,operating,MPSS):
     xts = xul
     xbs = xdl
     for i in range(MPSS):
-        sets+=(tuple(product(numpy.arange(xdl,xul,1),numpy.arange(ydl,yul,1))),)
+        sets+=((slice(xdl,xul,1),slice(ydl,yul,1)),)
         xdl+=operating
         xul-=operating
         ydl-=operating
@@ -171,10 +245,28 @@ def setupCPUStandard(solver):
     makeReadBlocksStandard(solver,solver.operating)
     solver.cpu.set_globals(*solver.globals)
     #Creating sets for cpu calculation
-    standardSet = [(x+solver.operating,y+solver.operating) for x,y in numpy.ndindex(solver.blocksize[:-1])]
+    standardSet = ((slice(solver.operating,solver.blocksize[0]+solver.operating,1),slice(solver.operating,solver.blocksize[1]+solver.operating,1)),)
     #Initializing CPU on standard
     cshape = solver.sharedArray[solver.blocks[0][1]].shape if solver.blocks else (0,)
     solver.standard.initializeCPU(solver.cpu,standardSet,solver.intermediate-1,cshape) 
+    solver.standard.setInPlace(solver.inPlace)
+    createThreadPool(solver)
+    solver.standard.setPool(solver.pool)
+    createBlockCounter(solver,(solver.standard,))
+    splitBlocksStandard(solver)
+
+def splitBlocksStandard(solver):
+    """Use this function to split standard blocks into interior blocks, which do not read the x halos, and boundary blocks.
+    Interior blocks are solved while halos are exchanged when overlap is enabled, otherwise every block is a boundary block.
+    """
+    nx,ops = solver.sharedShape[2],solver.operating
+    isInterior = lambda block: solver.overlap and block[1][2].start >= ops and block[1][2].stop <= nx-ops
+    solver.interiorBlocks = [block for block in solver.blocks if isInterior(block)]
+    solver.boundaryBlocks = [block for block in solver.blocks if not isInterior(block)]
+
+def createThreadPool(solver):
+    """Use this function to create the thread pool that solves the cpu blocks of a rank if more than one thread is requested."""
+    solver.pool = ThreadPoolExecutor(max_workers=solver.threads) if solver.threads > 1 and len(solver.blocks) > 1 else None
 
 
 def makeReadBlocksStandard(solver, adjustment):
@@ -216,10 +308,8 @@ def standardBlock(solver):
     """This is the entry point for the standard portion of the block module."""
     #Create and fill shared array
     createCPUSharedArray(solver,numpy.zeros(solver.sharedShape,dtype=solver.dtype).nbytes)
-    for i in range(solver.intermediate):
-        solver.sharedArray[i,:,solver.operating:-solver.operating,solver.operating:-solver.operating] =  solver.initialConditions[solver.globalBlock]
-        solver.sharedArray[i,:,solver.operating:-solver.operating,:solver.operating] = solver.initialConditions[solver.globalBlock[0],solver.globalBlock[1],-solver.operating-1:-1]
-        solver.sharedArray[i,:,solver.operating:-solver.operating,-solver.operating:] = solver.initialConditions[solver.globalBlock[0],solver.globalBlock[1],1:solver.operating+1]
+    if not solver.restart:
+        loadInitialConditions(solver,solver.operating) #Restarted runs are loaded from the checkpoint
     #Create phase objects
     solver.standard = geometry.Geometry() 
     solver.standard.setAdjustment(solver.operating)
@@ -232,6 +322,8 @@ def standardBlock(solver):
         setupGPUStandard(solver)
     #Setup CPU
     setupCPUStandard(solver)
+    if solver.overlap:
+        process.createHaloRequests(solver)
     solver.comm.Barrier() #Ensure all processes are
 
 
@@ -1,7 +1,7 @@
 #Programmer: Anthony Walker
 #This file contains all of the necessary functions for implementing the swept rule.
 #------------------------------Decomp Functions----------------------------------
-import numpy
+import numpy, mpi4py.MPI as MPI
 try:
     import pysweep.core.io as io
     import pycuda.driver as cuda
@@ -9,6 +9,24 @@ except Exception as e:
     pass
 #------------------------------Swept Functions----------------------------------
 
+def setTimeBase(solver,timeBase):
+    """Use this function to set the level of the shared array time ring that relative time level zero is stored in."""
+    levels = solver.sharedShape[0]
+    solver.timeBase = timeBase%levels
+    solver.timeOrder = (solver.timeBase+numpy.arange(levels))%levels #relative to ring levels
+    solver.timeInverse = (numpy.arange(levels)-solver.timeBase)%levels #ring to relative levels
+    for phase in ("Up","Down","Xb","Yb","Oct"):
+        if hasattr(solver,phase):
+            getattr(solver,phase).setTimeBase(solver.timeBase)
+
+def readGPUBlock(solver):
+    """Use this function to copy the gpu read block into the local gpu array in relative time order."""
+    numpy.take(solver.sharedArray[solver.gpuReadBlock],solver.timeOrder,axis=0,out=solver.localGPUArray)
+
+def writeGPUBlock(solver):
+    """Use this function to copy the local gpu array back to the gpu block in ring time order."""
+    solver.sharedArray[solver.gpuBlock] = solver.localGPUArray[solver.timeInverse,:,:,solver.blocksize[0]:-solver.blocksize[0]]
+
 def FirstPrism(solver):
     """
     This is the starting pyramid for the 2D heterogeneous swept rule cpu portion.
@@ -18,19 +36,21 @@ def FirstPrism(solver):
     """
     #Start GPU Operations
     if solver.gpuBool:
-        solver.localGPUArray[:,:,:,:] = solver.sharedArray[solver.gpuReadBlock]
+        readGPUBlock(solver)
         cuda.memcpy_htod(solver.GPUArray,solver.localGPUArray)
         solver.Up.callGPU(solver.GPUArray,solver.globalTimeStep)
         solver.Yb.callGPU(solver.GPUArray,solver.globalTimeStep)
     #Do CPU Operations
+    receiveColumns(solver)
     solver.Up.callCPU(solver.sharedArray,solver.edgeblocks,solver.globalTimeStep)
     solver.nodeComm.Barrier() #need barrier to make sure all data is in place for next step
+    returnColumns(solver)
     solver.Yb.callCPU(solver.sharedArray,solver.blocks,solver.globalTimeStep)
     #Cleanup GPU Operations
     if solver.gpuBool:
         cuda.Context.synchronize()
         cuda.memcpy_dtoh(solver.localGPUArray,solver.GPUArray)
-        solver.sharedArray[solver.gpuBlock]=solver.localGPUArray[:,:,:,solver.blocksize[0]:-solver.blocksize[0]]
+        writeGPUBlock(solver)
     solver.Yb.startAdd(solver.maxPyramidSize) #Change starting location for UpPrism
     solver.nodeComm.Barrier() #Node barrier here before the write
 
@@ -43,7 +63,7 @@ def UpPrism(solver):
     """
     #Start GPU Operations
     if solver.gpuBool:
-        solver.localGPUArray[:,:,:,:] = solver.sharedArray[solver.gpuReadBlock]
+        readGPUBlock(solver)
         cuda.memcpy_htod(solver.GPUArray,solver.localGPUArray)  
         solver.Xb.callGPU(solver.GPUArray,solver.globalTimeStep)
         solver.Oct.callGPU(solver.GPUArray,solver.globalTimeStep)
@@ -51,15 +71,17 @@ def UpPrism(solver):
     #Do CPU  Operations
     solver.Xb.callCPU(solver.sharedArray,solver.blocks,solver.globalTimeStep)
     solver.nodeComm.Barrier() #need barrier to make sure all data is in place for next step
+    receiveColumns(solver)
     solver.Oct.callCPU(solver.sharedArray,solver.edgeblocks,solver.globalTimeStep)
     solver.nodeComm.Barrier() #need barrier to make sure all data is in place for next step
+    returnColumns(solver)
     solver.globalTimeStep+=solver.maxPyramidSize #Add pyramid to global time step so ybridge starts at appropriate step for intermediate schemes
     solver.Yb.callCPU(solver.sharedArray,solver.blocks,solver.globalTimeStep)
     #Cleanup GPU Operations
     if solver.gpuBool:
         cuda.Context.synchronize()
         cuda.memcpy_dtoh(solver.localGPUArray,solver.GPUArray)
-        solver.sharedArray[solver.gpuBlock]=solver.localGPUArray[:,:,:,solver.blocksize[0]:-solver.blocksize[0]]
+        writeGPUBlock(solver)
     solver.nodeComm.Barrier() #Node barrier here before the write
 
 def LastPrism(solver):
@@ -71,54 +93,98 @@ def LastPrism(solver):
     """
     #Start GPU Operations
     if solver.gpuBool:
-        solver.localGPUArray[:,:,:,:] = solver.sharedArray[solver.gpuReadBlock]
+        readGPUBlock(solver)
         cuda.memcpy_htod(solver.GPUArray,solver.localGPUArray)  
         solver.Xb.callGPU(solver.GPUArray,solver.globalTimeStep)
         solver.Down.callGPU(solver.GPUArray,solver.globalTimeStep)
     #Do CPU Operations
     solver.Xb.callCPU(solver.sharedArray,solver.blocks,solver.globalTimeStep)
     solver.nodeComm.Barrier() #need barrier to make sure all data is in place for next step
+    receiveColumns(solver)
     solver.Down.callCPU(solver.sharedArray,solver.edgeblocks,solver.globalTimeStep)
     #Cleanup GPU Operations
     if solver.gpuBool:
         cuda.Context.synchronize()
         cuda.memcpy_dtoh(solver.localGPUArray,solver.GPUArray)
-        solver.sharedArray[solver.gpuBlock]=solver.localGPUArray[:,:,:,solver.blocksize[0]:-solver.blocksize[0]]
+        writeGPUBlock(solver)
     solver.globalTimeStep+=solver.maxPyramidSize #Need this for the write of intermediate steps
     solver.nodeComm.Barrier() #Node barrier here before the write
+    returnColumns(solver)
+
+def shiftBlocks(solver):
+    """Use this function to switch the blocks between their unshifted and shifted (back by splitx) positions on the x ring of the shared array."""
+    solver.blocks,solver.shiftedBlocks = solver.shiftedBlocks,solver.blocks
+    solver.edgeblocks,solver.shiftedEdgeblocks = solver.shiftedEdgeblocks,solver.edgeblocks
+    if solver.gpuBool:
+        solver.gpuBlock,solver.shiftedGPUBlock = solver.shiftedGPUBlock,solver.gpuBlock
+        solver.gpuReadBlock,solver.shiftedGPUReadBlock = solver.shiftedGPUReadBlock,solver.gpuReadBlock
+
+def exchangeRing(solver,dest,source):
+    """Use this function to replace the last splitx rows of the x ring with those of source after sending them to dest"""
+    solver.clusterComm.Sendrecv_replace([solver.sharedArray,1,solver.haloTypes["ring"]],dest=dest,source=source)
+
+def receiveColumns(solver):
+    """Use this function to receive the first splity columns of the y forward neighbor into the y halo before edge blocks are solved on a node grid split in y.
+    The last edge block of a node spans its last and the neighbor's first splity columns.
+    """
+    if solver.yNeighbors is None:
+        return
+    if solver.nodeMasterBool:
+        back,forward = solver.yNeighbors
+        solver.clusterComm.Sendrecv([solver.sharedArray,1,solver.haloTypes["edge"]],dest=back,sendtag=2,recvbuf=[solver.sharedArray,1,solver.haloTypes["yHalo"]],source=forward,recvtag=2)
+    solver.nodeComm.Barrier() #Wait for the halo before solving edge blocks
+
+def returnColumns(solver):
+    """Use this function to return the y halo solved with the edge blocks to the y forward neighbor, every rank must have finished its edge blocks."""
+    if solver.yNeighbors is None:
+        return
+    if solver.nodeMasterBool:
+        back,forward = solver.yNeighbors
+        solver.clusterComm.Sendrecv([solver.sharedArray,1,solver.haloTypes["yHalo"]],dest=forward,sendtag=3,recvbuf=[solver.sharedArray,1,solver.haloTypes["edge"]],source=back,recvtag=3)
+    solver.nodeComm.Barrier() #Wait for the returned columns before solving blocks
+
+def restartSwept(solver):
+    """Use this function to restore the shared array, time ring, and block positions of a swept run from its checkpoint, it returns the write time and the next loop iteration."""
+    cwt,position,solver.globalTimeStep,timeBase = io.readCheckpoint(solver)
+    solver.Yb.startAdd(solver.maxPyramidSize) #As after FirstPrism
+    if position%2 == 0:
+        shiftBlocks(solver) #Blocks are shifted by firstForward and every exchange after it
+    setTimeBase(solver,timeBase)
+    return cwt,position
 
 def firstForward(solver):
     """Use this function to communicate data between nodes"""
     if solver.nodeMasterBool:
-        buff = numpy.copy(solver.sharedArray[:,:,-solver.splitx:,:])
-        buffer = solver.clusterComm.sendrecv(sendobj=buff,dest=solver.neighbors[1],source=solver.neighbors[0])
-        solver.clusterComm.Barrier() #Barrier to make sure all buffers are copied before writing
-        solver.sharedArray[:,:,solver.splitx:,:] = solver.sharedArray[:,:,:-solver.splitx,:] #Shift solver.sharedArray data forward by solver.splitx
-        solver.sharedArray[:,:,:solver.splitx,:] = buffer[:,:,:,:]
+        exchangeRing(solver,solver.neighbors[1],solver.neighbors[0])
+    shiftBlocks(solver)
     solver.nodeComm.Barrier() #Wait for copy before calculating again
 
 
 def sendForward(cwt,solver):
     """Use this function to communicate data between nodes"""
+    if solver.collectiveWrite:
+        cwt = io.collectiveSweptWrite(cwt,solver)
+        solver.nodeComm.Barrier() #Wait for the write before the exchange replaces rows
     if solver.nodeMasterBool:
-        cwt = io.sweptWrite(cwt,solver)
-        buff = numpy.copy(solver.sharedArray[:,:,-solver.splitx:,:])
-        buffer = solver.clusterComm.sendrecv(sendobj=buff,dest=solver.neighbors[1],source=solver.neighbors[0])
-        solver.clusterComm.Barrier() #Barrier to make sure all buffers are copied before writing
-        solver.sharedArray[:,:,solver.splitx:,:] = solver.sharedArray[:,:,:-solver.splitx,:] #Shift solver.sharedArray data forward by solver.splitx
-        solver.sharedArray[:,:,:solver.splitx,:] = buffer[:,:,:,:]
+        if not solver.collectiveWrite:
+            cwt = io.sweptWrite(cwt,solver)
+        exchangeRing(solver,solver.neighbors[1],solver.neighbors[0])
+    shiftBlocks(solver)
+    setTimeBase(solver,solver.timeBase+solver.maxPyramidSize) #Written levels are reused
     solver.nodeComm.Barrier() #Wait for copy before calculating again
     return cwt
 
 def sendBackward(cwt,solver):
     """Use this function to communicate data between nodes"""
     if solver.nodeMasterBool:
-        buff = numpy.copy(solver.sharedArray[:,:,:solver.splitx,:])
-        buffer = solver.clusterComm.sendrecv(sendobj=buff,dest=solver.neighbors[0],source=solver.neighbors[1])
-        solver.clusterComm.Barrier() #Barrier to make sure all buffers are copied before writing
-        solver.sharedArray[:,:,:-solver.splitx,:] = solver.sharedArray[:,:,solver.splitx:,:] #Shift solver.sharedArray backward data by solver.splitx
-        solver.sharedArray[:,:,-solver.splitx:,:] = buffer[:,:,:,:]
-        cwt = io.sweptWrite(cwt,solver)
+        exchangeRing(solver,solver.neighbors[0],solver.neighbors[1])
+        if not solver.collectiveWrite:
+            cwt = io.sweptWrite(cwt,solver)
+    if solver.collectiveWrite:
+        solver.nodeComm.Barrier() #Wait for the exchange before writing
+        cwt = io.collectiveSweptWrite(cwt,solver)
+    shiftBlocks(solver)
+    setTimeBase(solver,solver.timeBase+solver.maxPyramidSize) #Written levels are reused
     solver.nodeComm.Barrier() #Wait for copy before calculating again
     return cwt
 
@@ -130,13 +196,17 @@ def StandardFunction(solver):
     fcn - the function that solves the problem in question
     OPS -  the number of atomic operations
     """
+    #Solving interior blocks while halos are in flight
+    if solver.overlap:
+        solver.standard.callStandardCPU(solver.sharedArray,solver.interiorBlocks,solver.globalTimeStep)
+        finishEdges(solver)
     #Calling Standard GPU
     if solver.gpuBool:
         solver.localGPUArray[:,:,:,:] = solver.sharedArray[solver.gpuReadBlock]
         cuda.memcpy_htod(solver.GPUArray,solver.localGPUArray)  
         solver.standard.callStandardGPU(solver.GPUArray,solver.globalTimeStep)      
     #Calling standard CPU 
-    solver.standard.callStandardCPU(solver.sharedArray,solver.blocks,solver.globalTimeStep)
+    solver.standard.callStandardCPU(solver.sharedArray,solver.boundaryBlocks,solver.globalTimeStep)
     #Clean up GPU processes
     if solver.gpuBool:
         cuda.Context.synchronize()
@@ -147,16 +217,36 @@ def StandardFunction(solver):
 
 def sendEdges(solver):
     """Use this function to communicate data between nodes"""
-    ops = solver.operating
     if solver.nodeMasterBool:
+        exchangeColumns(solver)
+        #Halos are sent from and received into the shared array
+        solver.clusterComm.Sendrecv([solver.sharedArray,1,solver.haloTypes["forward"]],dest=solver.neighbors[1],recvbuf=[solver.sharedArray,1,solver.haloTypes["front"]],source=solver.neighbors[0])
+        solver.clusterComm.Sendrecv([solver.sharedArray,1,solver.haloTypes["backward"]],dest=solver.neighbors[0],recvbuf=[solver.sharedArray,1,solver.haloTypes["back"]],source=solver.neighbors[1])
+    solver.nodeComm.Barrier() #Wait for copy before calculating again
+
+def exchangeColumns(solver):
+    """Use this function to fill the y halos of a node before its x halos are exchanged, so x halos carry the corners.
+    The y boundaries are copied within the node if it spans y and exchanged with its y neighbors otherwise.
+    """
+    ops = solver.operating
+    if solver.yNeighbors is None:
         solver.sharedArray[:,:,ops:-ops,:ops] = solver.sharedArray[:,:,ops:-ops,-2*ops:-ops] #Copy y boundaries
         solver.sharedArray[:,:,ops:-ops,-ops:] = solver.sharedArray[:,:,ops:-ops,ops:2*ops]
-        bufffor = numpy.copy(solver.sharedArray[:,:,-2*ops:-ops,:])
-        buffback = numpy.copy(solver.sharedArray[:,:,ops:2*ops,:])
-        bufferf = solver.clusterComm.sendrecv(sendobj=bufffor,dest=solver.neighbors[1],source=solver.neighbors[0])
-        bufferb = solver.clusterComm.sendrecv(sendobj=buffback,dest=solver.neighbors[0],source=solver.neighbors[1])
-        solver.clusterComm.Barrier()
-        solver.sharedArray[:,:,:ops,:] = bufferf[:,:,:,:]
-        solver.sharedArray[:,:,-ops:,:] = bufferb[:,:,:,:]
-    solver.nodeComm.Barrier() #Wait for copy before calculating again
+    else:
+        back,forward = solver.yNeighbors
+        solver.clusterComm.Sendrecv([solver.sharedArray,1,solver.haloTypes["yForward"]],dest=forward,sendtag=2,recvbuf=[solver.sharedArray,1,solver.haloTypes["yFront"]],source=back,recvtag=2)
+        solver.clusterComm.Sendrecv([solver.sharedArray,1,solver.haloTypes["yBackward"]],dest=back,sendtag=3,recvbuf=[solver.sharedArray,1,solver.haloTypes["yBack"]],source=forward,recvtag=3)
 
+def startEdges(solver):
+    """Use this function to start communicating data between nodes without waiting for it to arrive"""
+    solver.nodeComm.Barrier() #Wait for all blocks to be shifted
+    if solver.nodeMasterBool:
+        exchangeColumns(solver)
+        MPI.Prequest.Startall(solver.haloRequests)
+    solver.nodeComm.Barrier() #Wait for y boundaries before calculating interior blocks
+
+def finishEdges(solver):
+    """Use this function to wait for the data started by startEdges"""
+    if solver.nodeMasterBool:
+        MPI.Request.Waitall(solver.haloRequests)
+    solver.nodeComm.Barrier() #Wait for halos before calculating boundary blocks
@@ -1,4 +1,49 @@
-import numpy
+import numpy, threading, mpi4py.MPI as MPI
+from functools import lru_cache
+
+def regionToIndices(region):
+    """Use this function to expand a region (tuple of x and y slices) into the (x,y) pairs expected by step.
+    The pairs are a read only int32 array of shape (N,2) that is shared by every geometry using the region.
+    """
+    xs,ys = region
+    return createIndexArray(xs.start,xs.stop,ys.start,ys.stop)
+
+@lru_cache(maxsize=None)
+def createIndexArray(xl,xu,yl,yu):
+    """Use this function to create the memoized index array of a region from its bounds."""
+    x,y = numpy.meshgrid(numpy.arange(xl,xu,1,dtype=numpy.int32),numpy.arange(yl,yu,1,dtype=numpy.int32),indexing='ij')
+    indices = numpy.stack((x.ravel(),y.ravel()),axis=1)
+    indices.flags.writeable = False
+    return indices
+
+def isSliceBlock(block):
+    """Use this function to determine if a block is made of slices so that indexing it gives a view."""
+    return all(isinstance(element,slice) for element in block)
+
+class BlockCounter(object):
+    """Use this class to claim the cpu blocks of a phase from a counter in shared memory that every rank of a node increments atomically.
+    The counter is never reset, every phase starts where all claims of the previous one ended, so phases must be separated by node barriers.
+    """
+    def __init__(self,win,chunk,ranks):
+        super(BlockCounter, self).__init__()
+        self.win = win #window whose first int64 on rank 0 is the counter
+        self.chunk = chunk #blocks claimed at once, one for every thread of a rank
+        self.ranks = ranks #ranks claiming blocks
+        self.base = 0 #counter value at the start of the phase
+        self.increment = numpy.array([chunk],dtype=numpy.int64)
+        self.value = numpy.zeros(1,dtype=numpy.int64)
+
+    def claim(self,blocks):
+        """Use this function to iterate over the chunks of blocks this rank claims, every rank of the node must claim from the same blocks."""
+        while True:
+            self.win.Fetch_and_op(self.increment,self.value,0,0,MPI.SUM)
+            self.win.Flush(0)
+            index = int(self.value[0])-self.base
+            if index >= len(blocks):
+                break
+            yield blocks[index:index+self.chunk]
+        #Every chunk is claimed once and every rank fails one claim
+        self.base += (-(-len(blocks)//self.chunk)+self.ranks)*self.chunk
 
 class Geometry(object):
     """Use this class to represent different phases in the swept process."""
@@ -9,7 +54,21 @@ class Geometry(object):
         """Use this function to initialize CPU arguments."""
         self.cpu,self.sets,start,cshape = args
         self.start = numpy.int32(start)
+        self.depth = int(start) #previous time levels a step may read
+        self.timeBase = 0
         self.CPUArray = numpy.zeros(cshape)
+        self.inPlace = True
+        self.pool = None
+        self.counter = None
+        self.setStepFunction()
+
+    def setStepFunction(self):
+        """Use this function to choose between the region (stepRegion) and point (step) contracts of the cpu module."""
+        if hasattr(self.cpu,"stepRegion"):
+            self.step = self.cpu.stepRegion
+        else: #Adapting regions to index sets for modules that only expose step
+            self.step = self.cpu.step
+            self.sets = tuple(regionToIndices(region) for region in self.sets)
 
     def initializeGPU(self,*args):
         """Use this function to initialize GPU arguments."""
@@ -23,17 +82,81 @@ class Geometry(object):
         """Use this to set the adjustment for standard"""
         self.adj = value
 
+    def setInPlace(self,value):
+        """Use this to set if slice blocks are solved in the shared array instead of a copy."""
+        self.inPlace = value
+
+    def setTimeBase(self,value):
+        """Use this to set the level of the time ring that relative time level zero is stored in."""
+        self.timeBase = value
+
+    def setPool(self,pool):
+        """Use this to set a thread pool that solves cpu blocks concurrently (None solves them serially)."""
+        self.pool = pool
+        self.local = threading.local()
+
+    def setCounter(self,counter):
+        """Use this to set a block counter the node blocks are claimed from (None solves the blocks given to the rank)."""
+        self.counter = counter
+
+    def getCPUArray(self):
+        """Use this function to get the array that copied blocks are solved in, each pool thread has its own."""
+        if self.pool is None:
+            return self.CPUArray
+        if not hasattr(self.local,"CPUArray"):
+            self.local.CPUArray = numpy.zeros(self.CPUArray.shape)
+        return self.local.CPUArray
+
+    def mapBlocks(self,function,blocks):
+        """Use this function to apply function to every block, or to the blocks this rank claims if a counter is set."""
+        if self.counter is None:
+            self.applyBlocks(function,blocks)
+        else:
+            for chunk in self.counter.claim(blocks):
+                self.applyBlocks(function,chunk)
+
+    def applyBlocks(self,function,blocks):
+        """Use this function to apply function to every block, concurrently if a pool is set."""
+        if self.pool is None:
+            for block in blocks:
+                function(block)
+        else: #list forces completion and raises any exceptions from the threads
+            list(self.pool.map(function,blocks))
+
     def callCPU(self,sharedArray,blocks,globalTimeStep):
         """Use this function to build the Up Pyramid."""
         #UpPyramid of Swept Step
-        for block in blocks:
-            ct = globalTimeStep
-            self.CPUArray[:,:,:,:] = sharedArray[block]
-            for ts,blockset in enumerate(self.sets,start=self.start):
-                #Calculating Step
-                self.cpu.step(self.CPUArray,blockset,ts,ct)
-                ct+=1
-            sharedArray[block] = self.CPUArray[:,:,:,:]
+        self.mapBlocks(lambda block: self.solveBlock(sharedArray,block,globalTimeStep),blocks)
+
+    def solveBlock(self,sharedArray,block,globalTimeStep):
+        """Use this function to solve all of the sets of a single swept block."""
+        ct = globalTimeStep
+        inPlace = self.inPlace and isSliceBlock(block) #wrapped edge blocks are always copied
+        if inPlace:
+            state = sharedArray[block]
+        else:
+            state = self.getCPUArray()
+            state[:,:,:,:] = sharedArray[block]
+        for ts,blockset in enumerate(self.sets,start=self.start):
+            #Calculating Step
+            self.stepLevel(state,blockset,ts,ct)
+            ct+=1
+        if not inPlace:
+            sharedArray[block] = state[:,:,:,:]
+
+    def stepLevel(self,state,blockset,ts,globalTimeStep):
+        """Use this function to step from relative time level ts on the time ring of state.
+        Steps with levels that straddle the end of the ring are taken in a gathered window of depth+2 levels.
+        """
+        levels = state.shape[0]
+        t = (self.timeBase+ts)%levels
+        if t >= self.depth and t+1 < levels:
+            self.step(state,blockset,t,globalTimeStep)
+        else:
+            window = numpy.arange(t-self.depth,t+2)%levels
+            gathered = state[window]
+            self.step(gathered,blockset,self.depth,globalTimeStep)
+            state[window[-1]] = gathered[-1]
 
     def callGPU(self,GPUArray,globalTimeStep):
         """Use this function to build the Up Pyramid."""
@@ -48,8 +171,15 @@ class Geometry(object):
     def callStandardCPU(self,sharedArray,blocks,globalTimeStep):
         """Use this function to build the Up Pyramid."""
         #UpPyramid of Swept Step
-        for block in blocks:
-            writeblock,readblock = block
-            self.CPUArray[:,:,:,:] = sharedArray[readblock]
-            self.cpu.step(self.CPUArray,self.sets,self.start,globalTimeStep)
-            sharedArray[writeblock] = self.CPUArray[:,:,self.adj:-self.adj,self.adj:-self.adj]
+        self.mapBlocks(lambda block: self.solveStandardBlock(sharedArray,block,globalTimeStep),blocks)
+
+    def solveStandardBlock(self,sharedArray,block,globalTimeStep):
+        """Use this function to solve a single standard block."""
+        writeblock,readblock = block
+        if self.inPlace: #read blocks are always slices in standard
+            self.step(sharedArray[readblock],self.sets[0],self.start,globalTimeStep)
+        else:
+            state = self.getCPUArray()
+            state[:,:,:,:] = sharedArray[readblock]
+            self.step(state,self.sets[0],self.start,globalTimeStep)
+            sharedArray[writeblock] = state[:,:,self.adj:-self.adj,self.adj:-self.adj]
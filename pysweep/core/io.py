@@ -1,4 +1,5 @@
-import sys, os, h5py, time, yaml, numpy
+import sys, os, h5py, time, yaml, numpy, threading, queue, warnings, sqlite3, json
+import mpi4py.MPI as MPI
 from datetime import datetime
 from collections import Iterable
 try:
@@ -7,24 +8,156 @@ try:
 except Exception as e:
     pass
 
-def updateLogFile(solver,clocktime):
-    """Use this function to update log.yaml"""
-    if os.path.isfile('log.yaml'):
-        with open('log.yaml','r') as f:
-            previous = yaml.load(f,Loader=yaml.FullLoader)
-        new = getShortEntry(solver,clocktime)
-        previous.update(new)
-        with open('log.yaml','w') as f:
-            yaml.dump(previous,f)
+class AsyncWriter(object):
+    """Use this class to write time levels to the output dataset from a background thread.
+    Levels are copied into a fixed number of staging buffers, write blocks while all of them are waiting to be written.
+    """
+    def __init__(self,dataset,shape,dtype,buffers):
+        super(AsyncWriter, self).__init__()
+        self.dataset = dataset
+        self.error = None
+        self.free = queue.Queue()
+        self.pending = queue.Queue()
+        for i in range(buffers):
+            self.free.put(numpy.empty(shape,dtype=dtype))
+        self.thread = threading.Thread(target=self.drain,daemon=True)
+        self.thread.start()
+
+    def write(self,index,array):
+        """Use this function to stage array to be written to the dataset at index."""
+        self.raiseError()
+        buffer = self.free.get() #Back-pressure when all buffers are in use
+        buffer[:] = array
+        self.pending.put((index,buffer))
+
+    def drain(self):
+        """Use this function to write staged arrays until close is called, it runs in the background thread."""
+        item = self.pending.get()
+        while item is not None:
+            index,buffer = item
+            try:
+                self.dataset[index] = buffer
+            except Exception as e:
+                self.error = e
+            self.free.put(buffer)
+            self.pending.task_done()
+            item = self.pending.get()
+
+    def flush(self):
+        """Use this function to wait until all staged arrays are written."""
+        self.pending.join()
+        self.raiseError()
+
+    def close(self):
+        """Use this function to flush the staged arrays and stop the background thread."""
+        self.pending.put(None)
+        self.thread.join()
+        self.raiseError()
+
+    def raiseError(self):
+        """Use this function to raise an error from the background thread in the calling thread."""
+        if self.error is not None:
+            raise self.error
+
+def createWriter(solver,shape):
+    """Use this function to create the background writer of a node master if asynchronous writing is enabled."""
+    solver.writer = None
+    if solver.asyncWrite and solver.nodeMasterBool and not solver.collectiveWrite:
+        if MPI.Query_thread() < MPI.THREAD_MULTIPLE:
+            warnings.warn('MPI does not provide MPI_THREAD_MULTIPLE, output will be written synchronously.')
+        else:
+            solver.writer = AsyncWriter(solver.data,shape,solver.dtype,solver.writeBuffers)
+
+def writeData(solver,index,array):
+    """Use this function to write array to the output dataset at index, through the background writer if there is one."""
+    if solver.writer is None:
+        solver.data[index] = array
     else:
-        with open('log.yaml','w') as f:
-            entry = getShortEntry(solver,clocktime)
-            yaml.dump(entry,f)
+        solver.writer.write(index,array)
 
-def getShortEntry(obj,clocktime):
-    """Use this function for a condensed yaml entry."""
-    rundata = {"runtime":clocktime,"swept":obj.simulation,"blocksize":int(obj.blocksize[0]),"share":float(obj.share),"cpu":obj.cpuStr,"array_shape":list(obj.arrayShape),"time_per_step":float(clocktime/(obj.arrayShape[0]-1))}
-    return {datetime.now().strftime("%m/%d/%Y-%H:%M:%S"):rundata}
+logColumns = ("date","equation","swept","blocksize","share","nx","ny","processes","runtime","time_per_step","cpu","array_shape")
+
+def openLogFile(logFile):
+    """Use this function to open the run log database, the runs table and its index on the configuration are created if needed."""
+    connection = sqlite3.connect(logFile,timeout=60) #Concurrent jobs wait on the database lock
+    connection.execute("CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, date TEXT, equation TEXT, swept INTEGER, blocksize INTEGER, share REAL, nx INTEGER, ny INTEGER, processes INTEGER, runtime REAL, time_per_step REAL, cpu TEXT, array_shape TEXT)")
+    connection.execute("CREATE INDEX IF NOT EXISTS configuration ON runs (equation,swept,blocksize,share)")
+    return connection
+
+def appendLogEntries(logFile,entries):
+    """Use this function to append run entries, dictionaries with the log columns, to the run log in one transaction."""
+    connection = openLogFile(logFile)
+    try:
+        with connection:
+            connection.executemany("INSERT INTO runs ({}) VALUES ({})".format(",".join(logColumns),",".join("?"*len(logColumns))),[tuple(entry[column] for column in logColumns) for entry in entries])
+    finally:
+        connection.close()
+
+def updateLogFile(solver,clocktime):
+    """Use this function to append the run to the run log, unless the log file is None."""
+    if solver.logFile is not None:
+        appendLogEntries(solver.logFile,[getLogEntry(solver,clocktime),])
+
+def getLogEntry(solver,clocktime):
+    """Use this function to get the run log entry of a run."""
+    arrayShape = [int(s) for s in solver.arrayShape]
+    return {"date":datetime.now().strftime("%m/%d/%Y-%H:%M:%S"),"equation":getEquationName(solver.cpuStr),"swept":int(solver.simulation),"blocksize":int(solver.blocksize[0]),"share":float(solver.share),"nx":arrayShape[2],"ny":arrayShape[3],"processes":solver.comm.Get_size(),"runtime":float(clocktime),"time_per_step":float(clocktime/(arrayShape[0]-1)),"cpu":solver.cpuStr,"array_shape":json.dumps(arrayShape)}
+
+def getEquationName(cpu):
+    """Use this function to get the equation name, i.e., the module name, of a cpu source."""
+    return os.path.splitext(os.path.basename(cpu))[0]
+
+def queryLogFile(logFile,equation=None,swept=None,blocksize=None,share=None,unique=False):
+    """Use this function to get the runs matching the given configuration from the run log as dictionaries ordered by swept, nx, blocksize, and share.
+    unique keeps the first run of every configuration.
+    """
+    conditions,values = list(),list()
+    for column,value in zip(("equation","swept","blocksize","share"),(equation,swept,blocksize,share)):
+        if value is not None:
+            conditions.append("{}=?".format(column))
+            values.append(int(value) if column == "swept" else value)
+    query = "SELECT * FROM runs"
+    if unique:
+        query += " WHERE id IN (SELECT MIN(id) FROM runs GROUP BY equation,swept,nx,blocksize,share)"
+    if conditions:
+        query += (" AND " if unique else " WHERE ")+" AND ".join(conditions)
+    query += " ORDER BY swept,nx,blocksize,share,id"
+    connection = openLogFile(logFile)
+    connection.row_factory = sqlite3.Row
+    try:
+        rows = [dict(row) for row in connection.execute(query,values)]
+    finally:
+        connection.close()
+    for row in rows:
+        row["swept"] = bool(row["swept"])
+        row["array_shape"] = json.loads(row["array_shape"])
+    return rows
+
+def importLogFile(yamlFile,logFile):
+    """Use this function to append the entries of a log.yaml file to the run log."""
+    with open(yamlFile,'r') as f:
+        previous = yaml.load(f,Loader=yaml.FullLoader)
+    entries = list()
+    for date,rundata in previous.items():
+        arrayShape = [int(s) for s in rundata["array_shape"]]
+        entries.append({"date":date,"equation":getEquationName(rundata["cpu"]),"swept":int(rundata["swept"]),"blocksize":int(rundata["blocksize"]),"share":float(rundata["share"]),"nx":arrayShape[2],"ny":arrayShape[3],"processes":None,"runtime":float(rundata["runtime"]),"time_per_step":float(rundata["time_per_step"]),"cpu":rundata["cpu"],"array_shape":json.dumps(arrayShape)})
+    appendLogEntries(logFile,entries)
+
+def readCache(cacheFile):
+    """Use this function to read a yaml cache of measurements, e.g., node speeds, as a dictionary of sections."""
+    if not os.path.isfile(cacheFile):
+        return dict()
+    with open(cacheFile,'r') as f:
+        return yaml.load(f,Loader=yaml.FullLoader) or dict()
+
+def updateCache(cacheFile,entries):
+    """Use this function to add entries {section:{key:value}} to a yaml cache, the file is replaced at once so readers never see a partial cache."""
+    cache = readCache(cacheFile)
+    for section,values in entries.items():
+        cache.setdefault(section,dict()).update(values)
+    with open(cacheFile+".tmp",'w') as f:
+        yaml.dump(cache,f)
+    os.replace(cacheFile+".tmp",cacheFile)
 
 def generateYamlEntry(obj,clocktime):
     """Use this function to generate a yaml entry."""
@@ -68,6 +201,49 @@ def yamlManager(solver):
         pass
     #Setting output file
     solver.output = yamlGet('filename','output.hdf5')
+    #Setting in place cpu execution
+    solver.inPlace = yamlGet('in_place',True)
+    #Setting threads per cpu rank
+    solver.threads = yamlGet('threads',1)
+    #Setting standard compute and communication overlap
+    solver.overlap = yamlGet('overlap',False)
+    #Setting background writing of output
+    solver.asyncWrite = yamlGet('async_write',False)
+    solver.writeBuffers = yamlGet('write_buffers',8)
+    #Setting collective writing of output by all ranks
+    solver.collectiveWrite = yamlGet('collective_write',False)
+    #Setting output dataset chunking and compression
+    solver.chunks = yamlGet('chunks',None)
+    solver.compression = yamlGet('compression',None)
+    solver.compressionLevel = yamlGet('compression_level',4)
+    #Setting output decimation, variables, and region
+    solver.writeStride = yamlGet('write_stride',1)
+    solver.writeVariables = yamlGet('write_variables',None)
+    solver.writeRegion = yamlGet('write_region',None)
+    #Setting checkpoints and restart
+    solver.checkpointInterval = yamlGet('checkpoint_interval',0)
+    solver.checkpointFile = yamlGet('checkpoint_file',None)
+    solver.restart = yamlGet('restart',False)
+    #Setting output files for each node
+    solver.shardedOutput = yamlGet('sharded_output',False)
+    #Setting reductions and probes recorded every time level
+    solver.reductions = yamlGet('reductions',dict())
+    solver.probes = yamlGet('probes',list())
+    solver.diagnosticsFile = yamlGet('diagnostics_file',None)
+    #Setting grid of nodes
+    solver.nodeGrid = yamlGet('node_grid',None)
+    #Setting calibration of node speeds
+    solver.calibrate = yamlGet('calibrate',False)
+    solver.calibrationFile = yamlGet('calibration_file',"calibration.yaml")
+    #Setting order of blocks split across ranks
+    solver.blockOrder = yamlGet('block_order',"column")
+    #Setting dynamic claiming of blocks
+    solver.workStealing = yamlGet('work_stealing',False)
+    #Setting autotuning of simulation and blocksize
+    solver.autotune = yamlGet('autotune',False)
+    solver.autotuneFile = yamlGet('autotune_file',"autotune.yaml")
+    #Setting run log
+    solver.logFile = yamlGet('log_file',"log.db")
     #Settings datatype
     solver.dtypeStr=yamlGet('dtype','float64')
     solver.dtype = numpy.dtype(solver.dtypeStr)
@@ -78,17 +254,362 @@ def yamlManager(solver):
 def createOutputFile(solver):
     """Use this function to create output file which will act as the input file as well."""
     #Create input file
+    solver.shard = None
+    createDiagnosticsFile(solver)
+    if solver.shardedOutput and solver.collectiveWrite:
+        warnings.warn('Sharded output is written by node masters, disabling collective_write.')
+        solver.collectiveWrite = False
+    if solver.restart:
+        openOutputFile(solver)
+        return
+    solver.outputShape = getOutputShape(solver)
+    if solver.shardedOutput:
+        createShardedOutputFile(solver)
+        return
     solver.hdf5 = h5py.File(solver.output, 'w', driver='mpio', comm=solver.comm)
-    solver.hdf5.create_dataset("blocksize",(1,),data=(solver.blocksize[0],))
-    solver.hdf5.create_dataset("share",(1,),data=(solver.share,))
-    solver.hdf5.create_dataset("exid",(len(solver.exid),),data=solver.exid)
-    solver.hdf5.create_dataset("globals",(len(solver.globals),),data=solver.globals)
-    solver.clocktime = solver.hdf5.create_dataset("clocktime",(1,),data=0.0)
-    solver.data = solver.hdf5.create_dataset("data",solver.arrayShape,dtype=solver.dtype)
-    if solver.clusterMasterBool:
-        solver.data[0,:,:,:] = solver.initialConditions[:,:,:]
+    solver.clocktime = createInformation(solver,solver.hdf5)
+    if solver.compression is not None and solver.comm.Get_size() > 1 and not solver.collectiveWrite:
+        warnings.warn('Parallel writes to compressed datasets must be collective, enabling collective_write.')
+        solver.collectiveWrite = True
+    solver.data = createDataDataset(solver,solver.hdf5,solver.outputShape)
+    setupOutputWrites(solver)
+
+def createInformation(solver,hf):
+    """Use this function to create the datasets describing the simulation in an output file, it returns the clocktime dataset."""
+    hf.create_dataset("blocksize",(1,),data=(solver.blocksize[0],))
+    hf.create_dataset("share",(1,),data=(solver.share,))
+    hf.create_dataset("exid",(len(solver.exid),),data=solver.exid)
+    hf.create_dataset("globals",(len(solver.globals),),data=solver.globals)
+    return hf.create_dataset("clocktime",(1,),data=0.0)
+
+def createDataDataset(solver,hf,shape):
+    """Use this function to create the data dataset of the given shape with the chunking and compression of the output and record its layout."""
+    chunks = getChunkShape(solver)
+    if chunks is not None and 0 in shape:
+        chunks = None #Empty shards are not chunked
+    elif chunks is not None:
+        chunks = tuple(min(c,s) for c,s in zip(chunks,shape))
+    compression = solver.compression if chunks is not None else None
+    compressionOpts = solver.compressionLevel if compression == "gzip" else None
+    data = hf.create_dataset("data",shape,dtype=solver.dtype,chunks=chunks,compression=compression,compression_opts=compressionOpts)
+    setLayoutAttributes(solver,data,chunks)
+    return data
+
+def setLayoutAttributes(solver,data,chunks):
+    """Use this function to record the layout and the selection of the output in the attributes of a dataset."""
+    data.attrs["layout"] = "chunked" if chunks is not None else "contiguous"
+    data.attrs["chunk_layout"] = str(solver.chunks) if chunks is not None else "none"
+    data.attrs["chunks"] = chunks if chunks is not None else tuple()
+    data.attrs["compression"] = str(solver.compression) if solver.compression is not None else "none"
+    (x0,x1),(y0,y1) = getOutputRegion(solver)
+    data.attrs["write_stride"] = solver.writeStride
+    data.attrs["write_variables"] = getOutputVariables(solver)
+    data.attrs["write_region"] = ((x0,x1),(y0,y1))
+
+def getShardName(solver):
+    """Use this function to get the name of the output file of this node, node masters only."""
+    return os.path.splitext(solver.output)[0]+".node{}.hdf5".format(solver.clusterComm.Get_rank())
+
+def createShardedOutputFile(solver):
+    """Use this function to create an output file for each node that its master writes without MPI-IO.
+    The cluster master creates the output file with the usual datasets where data is a virtual dataset of the node files.
+    """
+    solver.hdf5 = solver.data = None
+    setupOutputSelection(solver)
+    fileRows,fileColumns = solver.outputFileRows,solver.outputFileColumns
+    solver.outputFileRows = slice(0,fileRows.stop-fileRows.start,1) #rows of the node file
+    solver.outputFileColumns = slice(0,fileColumns.stop-fileColumns.start,1)
+    if solver.nodeMasterBool:
+        shardName = getShardName(solver)
+        solver.shard = h5py.File(shardName,'w')
+        solver.data = createDataDataset(solver,solver.shard,solver.outputShape[:2]+(fileRows.stop-fileRows.start,fileColumns.stop-fileColumns.start))
+        shards = solver.clusterComm.gather((os.path.basename(shardName),fileRows,fileColumns))
+        if solver.clusterMasterBool:
+            solver.hdf5 = h5py.File(solver.output,'w')
+            solver.clocktime = createInformation(solver,solver.hdf5)
+            layout = h5py.VirtualLayout(shape=solver.outputShape,dtype=solver.dtype)
+            for name,rows,columns in shards:
+                if rows.stop > rows.start and columns.stop > columns.start:
+                    layout[:,:,rows,columns] = h5py.VirtualSource(name,"data",shape=solver.outputShape[:2]+(rows.stop-rows.start,columns.stop-columns.start)) #relative to the output file
+            data = solver.hdf5.create_virtual_dataset("data",layout,fillvalue=0)
+            setLayoutAttributes(solver,data,getChunkShape(solver))
+            data.attrs["layout"] = "virtual"
+            data.attrs["shards"] = [name for name,rows,columns in shards]
+    createWriter(solver,getWriteShape(solver))
+    solver.comm.Barrier()
+
+def openShardedOutputFile(solver):
+    """Use this function to open the node files and the output file of a sharded run that is restarted from a checkpoint."""
+    solver.hdf5 = solver.data = None
+    setupOutputSelection(solver)
+    solver.outputFileRows = slice(0,solver.outputFileRows.stop-solver.outputFileRows.start,1)
+    solver.outputFileColumns = slice(0,solver.outputFileColumns.stop-solver.outputFileColumns.start,1)
+    if solver.nodeMasterBool:
+        solver.shard = h5py.File(getShardName(solver),'r+')
+        solver.data = solver.shard["data"]
+        if solver.clusterMasterBool:
+            solver.hdf5 = h5py.File(solver.output,'r+')
+            solver.clocktime = solver.hdf5["clocktime"]
+    createWriter(solver,getWriteShape(solver))
     solver.comm.Barrier()
 
+def flushOutput(solver):
+    """Use this function to flush staged output and the open output files."""
+    if solver.writer is not None:
+        solver.writer.flush()
+    flushDiagnostics(solver)
+    for hf in (solver.hdf5,solver.shard):
+        if hf is not None:
+            hf.flush()
+
+def closeOutputFile(solver,clocktime):
+    """Use this function to record the clocktime and close the output files."""
+    flushDiagnostics(solver)
+    if solver.diagnostics is not None:
+        solver.diagnostics.close()
+    if solver.hdf5 is not None:
+        solver.clocktime[0] = clocktime
+        solver.hdf5.close()
+    if solver.shard is not None:
+        solver.shard.close()
+
+def openOutputFile(solver):
+    """Use this function to open the output file of a run that is restarted from a checkpoint."""
+    solver.outputShape = getOutputShape(solver)
+    if solver.shardedOutput:
+        openShardedOutputFile(solver)
+        return
+    solver.hdf5 = h5py.File(solver.output, 'r+', driver='mpio', comm=solver.comm)
+    solver.clocktime = solver.hdf5["clocktime"]
+    solver.data = solver.hdf5["data"]
+    assert solver.data.shape == solver.outputShape, "The output file of the restarted run does not match the simulation."
+    if solver.compression is not None and solver.comm.Get_size() > 1:
+        solver.collectiveWrite = True
+    setupOutputWrites(solver)
+
+def setupOutputWrites(solver):
+    """Use this function to set up the selection of the output that each process writes and its writer."""
+    if solver.collectiveWrite:
+        setupCollectiveWrite(solver)
+    setupOutputSelection(solver)
+    createWriter(solver,getWriteShape(solver))
+    solver.comm.Barrier()
+
+def getCheckpointRows(solver):
+    """Use this function to get the rows and columns of the node shared array this rank checkpoints and the rows and columns of the domain they hold, halos are not stored."""
+    iv,ix,iy = solver.globalBlock
+    ops = 0 if solver.simulation else solver.operating
+    start,stop = getNodeRankRows(solver)
+    return slice(start+ops,stop+ops,1),slice(ix.start+start,ix.start+stop,1),slice(ops,ops+iy.stop-iy.start,1),iy
+
+def writeCheckpoint(solver,cwt,position):
+    """Use this function to checkpoint the time levels of the shared arrays and the position of the solver.
+    Every rank writes its own rows, the checkpoint is written to a temporary file that replaces the previous one when it is complete.
+    """
+    flushOutput(solver)
+    solver.nodeComm.Barrier()
+    cwt = solver.comm.bcast(cwt) #Only node masters advance the write time without collective writes, attributes need the same value on every rank
+    temporary = solver.checkpointFile+".tmp"
+    rows,fileRows,columns,fileColumns = getCheckpointRows(solver)
+    iv,ix,iy = solver.globalBlock
+    with h5py.File(temporary,'w',driver='mpio',comm=solver.comm) as hf:
+        state = hf.create_dataset("state",(solver.sharedShape[0],)+tuple(solver.arrayShape[1:]),dtype=solver.dtype)
+        state.attrs["swept"] = solver.simulation
+        state.attrs["position"] = position
+        state.attrs["cwt"] = cwt
+        state.attrs["globalTimeStep"] = solver.globalTimeStep
+        state.attrs["timeBase"] = getattr(solver,"timeBase",0)
+        state.attrs["decomposition"] = sorted(set(solver.comm.allgather((ix.start,ix.stop,iy.start,iy.stop))))
+        if rows.stop > rows.start:
+            state[:,:,fileRows,fileColumns] = solver.sharedArray[:,:,rows,columns]
+    if solver.rank == 0:
+        os.replace(temporary,solver.checkpointFile)
+    solver.comm.Barrier()
+
+def readCheckpoint(solver):
+    """Use this function to load the time levels of the shared arrays from a checkpoint, it returns the write time, position, global time step, and time base."""
+    rows,fileRows,columns,fileColumns = getCheckpointRows(solver)
+    iv,ix,iy = solver.globalBlock
+    with h5py.File(solver.checkpointFile,'r',driver='mpio',comm=solver.comm) as hf:
+        state = hf["state"]
+        assert bool(state.attrs["swept"]) == solver.simulation and state.shape == (solver.sharedShape[0],)+tuple(solver.arrayShape[1:]), "The checkpoint does not match the simulation."
+        assert [tuple(d) for d in state.attrs["decomposition"]] == sorted(set(solver.comm.allgather((ix.start,ix.stop,iy.start,iy.stop)))), "The checkpoint was written with a different decomposition."
+        if rows.stop > rows.start:
+            solver.sharedArray[:,:,rows,columns] = state[:,:,fileRows,fileColumns]
+        position,cwt,globalTimeStep,timeBase = (int(state.attrs[key]) for key in ("position","cwt","globalTimeStep","timeBase"))
+    solver.nodeComm.Barrier()
+    return cwt,position,globalTimeStep,timeBase
+
+def checkpointDue(solver,position):
+    """Use this function to determine if a checkpoint is written after position loop iterations."""
+    return solver.checkpointInterval > 0 and position%solver.checkpointInterval == 0
+
+def getReductions(solver):
+    """Use this function to get the reductions as (name,function,operation,scale) where function reduces a level (variable,row,column) of a node and operation combines the nodes.
+    A reduction is given as [operation,variable] with operation sum, min, max, or mean of the variable, or as (function,operation) with operation sum, min, or max.
+    """
+    reductions = list()
+    for name,(first,second) in solver.reductions.items():
+        if callable(first):
+            function,operation,scale = first,second,1
+        else:
+            assert first in ("sum","min","max","mean"), "Invalid reduction {}, the operation must be sum, min, max, or mean.".format(name)
+            operation = "sum" if first == "mean" else first
+            scale = 1/(solver.arrayShape[2]*solver.arrayShape[3]) if first == "mean" else 1
+            function = lambda level,variable=int(second),operation=operation:getattr(numpy,operation)(level[variable])
+        assert operation in ("sum","min","max"), "Invalid reduction {}, nodes are combined with sum, min, or max.".format(name)
+        reductions.append((name,function,operation,scale))
+    return reductions
+
+def createDiagnosticsFile(solver):
+    """Use this function to set up the reductions and probes recorded every time level, the cluster master creates the file they are written to."""
+    solver.diagnostics = None
+    solver.diagnosticLevels = list()
+    solver.diagnosticReductions = getReductions(solver)
+    nt,nv,nx,ny = solver.arrayShape
+    for x,y in solver.probes:
+        assert 0<=x<nx and 0<=y<ny, "Invalid probe, it must be within the domain as [x,y]."
+    if not (solver.diagnosticReductions or solver.probes):
+        return
+    if solver.diagnosticsFile is None:
+        solver.diagnosticsFile = os.path.splitext(solver.output)[0]+"Diagnostics.hdf5"
+    if solver.clusterMasterBool:
+        if solver.restart:
+            solver.diagnostics = h5py.File(solver.diagnosticsFile,'r+')
+        else:
+            solver.diagnostics = h5py.File(solver.diagnosticsFile,'w')
+            solver.diagnostics.create_dataset("time",(nt,),data=solver.globals[0]+numpy.arange(nt)*solver.globals[2])
+            solver.diagnostics.create_group("reductions")
+            probes = solver.diagnostics.create_dataset("probes",(nt,len(solver.probes),nv),dtype=solver.dtype,fillvalue=numpy.nan)
+            probes.attrs["points"] = numpy.reshape(solver.probes,(len(solver.probes),2))
+
+def recordDiagnostics(solver,cwt,level):
+    """Use this function to evaluate the reductions and probes of the node on a finished level (variable,row,column) at time cwt, node masters only."""
+    if not solver.nodeMasterBool or not (solver.diagnosticReductions or solver.probes):
+        return
+    iv,ix,iy = solver.globalBlock
+    values = [function(level) for name,function,operation,scale in solver.diagnosticReductions]
+    probes = {i:numpy.array(level[:,x-ix.start,y-iy.start]) for i,(x,y) in enumerate(solver.probes) if ix.start<=x<ix.stop and iy.start<=y<iy.stop}
+    solver.diagnosticLevels.append((cwt,values,probes))
+
+def flushDiagnostics(solver):
+    """Use this function to combine the recorded reductions and probes of all nodes and write them, every rank must call it."""
+    if not solver.nodeMasterBool or not (solver.diagnosticReductions or solver.probes):
+        return
+    nodeLevels = solver.clusterComm.gather(solver.diagnosticLevels)
+    solver.diagnosticLevels = list()
+    if not solver.clusterMasterBool:
+        return
+    combined = dict()
+    for levels in nodeLevels:
+        for cwt,values,probes in levels:
+            combined.setdefault(cwt,list()).append((values,probes))
+    if not combined:
+        return
+    times = sorted(combined)
+    reductions = solver.diagnostics["reductions"]
+    for i,(name,function,operation,scale) in enumerate(solver.diagnosticReductions):
+        values = numpy.array([getattr(numpy,operation)([values[i] for values,probes in combined[cwt]],axis=0)*scale for cwt in times])
+        if name not in reductions:
+            reductions.create_dataset(name,(solver.arrayShape[0],)+values.shape[1:],dtype=numpy.float64,fillvalue=numpy.nan)
+        reductions[name][times] = values
+    if solver.probes:
+        probes = numpy.full((len(times),)+solver.diagnostics["probes"].shape[1:],numpy.nan,dtype=solver.dtype)
+        for j,cwt in enumerate(times):
+            for values,nodeProbes in combined[cwt]:
+                for i,value in nodeProbes.items():
+                    probes[j,i] = value
+        solver.diagnostics["probes"][times] = probes
+    solver.diagnostics.flush()
+
+def getOutputRegion(solver):
+    """Use this function to get the region ((x0,x1),(y0,y1)) of the domain that is written out."""
+    nv,nx,ny = solver.arrayShape[1:]
+    if solver.writeRegion is None:
+        return (0,nx),(0,ny)
+    (x0,x1),(y0,y1) = solver.writeRegion
+    assert 0<=x0<x1<=nx and 0<=y0<y1<=ny, "Invalid write region, it must be within the domain as [[x0,x1],[y0,y1]]."
+    return (int(x0),int(x1)),(int(y0),int(y1))
+
+def getOutputVariables(solver):
+    """Use this function to get the indices of the variables that are written out."""
+    return list(range(solver.arrayShape[1])) if solver.writeVariables is None else [int(var) for var in solver.writeVariables]
+
+def getOutputShape(solver):
+    """Use this function to get the shape of the output dataset from the stride, variables, and region that are written."""
+    (x0,x1),(y0,y1) = getOutputRegion(solver)
+    levels = (solver.arrayShape[0]+solver.writeStride-1)//solver.writeStride if solver.writeStride > 0 else 0
+    return (levels,len(getOutputVariables(solver)),x1-x0,y1-y0)
+
+def setupOutputSelection(solver):
+    """Use this function to intersect the rows and columns this process writes with the output region.
+    outputRows and outputColumns are of the node's portion of the domain and outputFileRows and outputFileColumns are the corresponding ones of the output dataset.
+    """
+    iv,ix,iy = solver.globalBlock
+    start,stop = solver.writeRows if solver.collectiveWrite else (0,ix.stop-ix.start)
+    solver.outputRows,solver.outputFileRows = getOutputSelection(solver,start,stop)
+    solver.outputColumns,solver.outputFileColumns = getOutputColumns(solver)
+    solver.outputVariables = slice(None) if solver.writeVariables is None else getOutputVariables(solver)
+
+def getOutputSelection(solver,start,stop):
+    """Use this function to get the rows of the node and of the output dataset where rows start to stop of the node intersect the output region."""
+    iv,ix,iy = solver.globalBlock
+    (x0,x1),(y0,y1) = getOutputRegion(solver)
+    lower = max(ix.start+start,x0)
+    upper = max(min(ix.start+stop,x1),lower)
+    return slice(lower-ix.start,upper-ix.start,1),slice(lower-x0,upper-x0,1)
+
+def getOutputColumns(solver):
+    """Use this function to get the columns of the node and of the output dataset where the columns of the node intersect the output region."""
+    iv,ix,iy = solver.globalBlock
+    (x0,x1),(y0,y1) = getOutputRegion(solver)
+    lower = max(iy.start,y0)
+    upper = max(min(iy.stop,y1),lower)
+    return slice(lower-iy.start,upper-iy.start,1),slice(lower-y0,upper-y0,1)
+
+def getWriteShape(solver):
+    """Use this function to get the shape (variable,row,column) of the part of a level this process writes."""
+    return (len(getOutputVariables(solver)),solver.outputRows.stop-solver.outputRows.start,solver.outputColumns.stop-solver.outputColumns.start)
+
+def getNodeRankRows(solver):
+    """Use this function to split the rows of a node among its ranks in whole blocks, so ranks never share a block or an output chunk."""
+    iv,ix,iy = solver.globalBlock
+    bs = solver.blocksize[0]
+    blocks = numpy.array_split(numpy.arange((ix.stop-ix.start)//bs),solver.nodeComm.Get_size())[solver.nodeComm.Get_rank()]
+    return (int(blocks[0])*bs,(int(blocks[-1])+1)*bs) if blocks.size else (0,0)
+
+def writeInitialConditions(solver,slab,start,stop):
+    """Use this function to write the initial conditions of rows start to stop of the node (variable,row,column) to the first level of the output dataset.
+    Every rank writes its own rows so the write is collective if collective writing is enabled.
+    """
+    if solver.shardedOutput or not isKept(solver,0):
+        return #Node masters write the initial conditions of their node
+    rows,fileRows = getOutputSelection(solver,start,stop)
+    level = slab[solver.outputVariables,rows.start-start:rows.stop-start,solver.outputColumns]
+    if solver.collectiveWrite:
+        writeCollective(solver,0,level[None,:,:,:])
+    elif level.size:
+        solver.data[0,:,fileRows,solver.outputFileColumns] = level
+
+def getChunkShape(solver):
+    """Use this function to get the chunk shape of the output dataset, chunks hold one kept time level of the written variables and are limited to the written region.
+    Chunks only line up with node slabs, which are split on block boundaries, if the write region starts on one, otherwise they may be shared by two nodes which is safe since filtered output is written collectively.
+    block - one block of every variable, slab - a block wide strip of rows spanning y, a tuple is used as given.
+    """
+    chunks = solver.chunks
+    if chunks is None and solver.compression is not None:
+        chunks = "block" #filters require a chunked layout
+    nt,nv,nx,ny = solver.outputShape
+    bs = solver.blocksize[0]
+    if chunks is None:
+        return None
+    elif chunks == "block":
+        return (1,nv,min(bs,nx),min(bs,ny))
+    elif chunks == "slab":
+        return (1,nv,min(bs,nx),ny)
+    else:
+        return tuple(int(c) for c in chunks)
+
 def verbosePrint(solver,outString):
     """Use this function to print only when verbose option is specified."""
     if solver.verbose and solver.clusterMasterBool:
@@ -114,8 +635,24 @@ def getSolverPrint(solver):
     returnString+="\tdtype: {}\n".format(solver.dtype)
     returnString+="\tshare: {}\n".format(solver.share)
     returnString+="\tblocksize: {}\n".format(solver.blocksize[0])
+    returnString+="\tautotune: {}\n".format(solver.autotune)
+    returnString+="\tnode grid: {}\n".format(solver.nodeGrid)
+    returnString+="\tblock order: {}\n".format(solver.blockOrder)
+    returnString+="\tnode weights: {}\n".format(getattr(solver,"nodeWeights",None) if solver.calibrate else None)
     returnString+="\tstencil size: {}\n".format(int(solver.operating*2+1))
     returnString+="\tintermediate time steps: {}\n".format(solver.intermediate)
+    returnString+="\tthreads per cpu rank: {}\n".format(solver.threads)
+    returnString+="\twork stealing: {}\n".format(solver.workStealing)
+    if not solver.simulation:
+        returnString+="\toverlap communication: {}\n".format(solver.overlap)
+    returnString+="\tasynchronous write: {}\n".format("{} buffers".format(solver.writeBuffers) if solver.asyncWrite else False)
+    returnString+="\tcollective write: {}\n".format(solver.collectiveWrite)
+    returnString+="\tsharded output: {}\n".format(solver.shardedOutput)
+    returnString+="\toutput chunks: {}, compression: {}\n".format(solver.chunks,solver.compression)
+    returnString+="\tcheckpoint interval: {}, restart: {}\n".format(solver.checkpointInterval,solver.restart)
+    returnString+="\toutput stride: {}, variables: {}, region: {}\n".format(solver.writeStride,"all" if solver.writeVariables is None else solver.writeVariables,"all" if solver.writeRegion is None else solver.writeRegion)
+    if solver.reductions or solver.probes:
+        returnString+="\treductions: {}, probes: {}\n".format(", ".join(solver.reductions) if solver.reductions else None,solver.probes)
     returnString+="\ttime data (t0,tf,dt): ({},{},{})\n".format(*solver.globals[:3])
     if solver.globals[5:]:
         returnString+="\tglobals: ["
@@ -131,18 +668,68 @@ def getSolverPrint(solver):
         returnString+="]\n"
     return returnString
 
+def getSweptWriteLevels(solver):
+    """Use this function to get the levels of the shared array time ring that are finished and written out this cycle."""
+    start = (solver.globalTimeStep+solver.subtraction)%solver.intermediate+solver.intermediate
+    return [(solver.timeBase+i)%solver.sharedShape[0] for i in range(start,solver.maxPyramidSize+solver.intermediate,solver.intermediate)]
+
 def sweptWrite(cwt,solver):
-    """Use this function to write to the hdf file and shift the shared array
-        # data after writing."""
-    iv,ix,iy = solver.globalBlock #Unpack global tuple
-    for i in range((solver.globalTimeStep+solver.subtraction)%solver.intermediate+solver.intermediate,solver.maxPyramidSize+solver.intermediate,solver.intermediate):
-        solver.data[cwt,iv,ix,iy] = solver.sharedArray[i,:,:,:]
+    """Use this function to write to the hdf file from the time ring of the shared array,
+        the written levels are reused after the time base is advanced."""
+    iv,ix,iy = solver.globalBlock
+    for level in getSweptWriteLevels(solver):
+        recordDiagnostics(solver,cwt,solver.sharedArray[level,:,:,:iy.stop-iy.start])
+        writeOutput(solver,cwt,solver.sharedArray[level,:,:,:iy.stop-iy.start])
         cwt+=1
-    nte = solver.sharedShape[0]-solver.maxPyramidSize
-    solver.sharedArray[:nte,:,:,:] = solver.sharedArray[solver.maxPyramidSize:,:,:,:]
-    # solver.sharedArray[nte:,:,:,:] = 0 #This shouldn't be necessary - debugging
     return cwt
 
+def writeOutput(solver,cwt,level):
+    """Use this function to write the selected variables and region of a level (variable,row,column) of the node if time cwt is kept by the stride."""
+    if isKept(solver,cwt) and solver.outputRows.stop > solver.outputRows.start and solver.outputColumns.stop > solver.outputColumns.start:
+        writeData(solver,(cwt//solver.writeStride,slice(None),solver.outputFileRows,solver.outputFileColumns),level[solver.outputVariables,solver.outputRows,solver.outputColumns])
+
+def getKeptLevels(solver,cwt,count):
+    """Use this function to get the positions of count levels starting at time cwt that are kept by the stride."""
+    return [i for i in range(count) if isKept(solver,cwt+i)]
+
+def isKept(solver,cwt):
+    """Use this function to determine if time cwt is written to the output file, a stride of 0 writes no levels."""
+    return solver.writeStride > 0 and cwt%solver.writeStride==0
+
+def collectiveSweptWrite(cwt,solver):
+    """Use this function to write the finished levels of this cycle in a single collective hyperslab write, every rank must call it."""
+    iv,ix,iy = solver.globalBlock
+    levels = getSweptWriteLevels(solver)
+    for i,level in enumerate(levels):
+        recordDiagnostics(solver,cwt+i,solver.sharedArray[level,:,:,:iy.stop-iy.start])
+    kept = [levels[i] for i in getKeptLevels(solver,cwt,len(levels))]
+    if kept:
+        rows = slice(solver.outputRows.start,solver.outputRows.stop,1)
+        writeCollective(solver,-(-cwt//solver.writeStride),numpy.take(solver.sharedArray[:,:,rows,solver.outputColumns],kept,axis=0)[:,solver.outputVariables])
+    return cwt+len(levels)
+
+def setupCollectiveWrite(solver):
+    """Use this function to split the rows of a node among its ranks for collective writes."""
+    solver.writeRows = getNodeRankRows(solver) #rows of the node written by this rank
+    solver.collectiveTransfer = h5py.h5p.create(h5py.h5p.DATASET_XFER)
+    if h5py.get_config().mpi:
+        solver.collectiveTransfer.set_dxpl_mpio(h5py.h5fd.MPIO_COLLECTIVE)
+
+def writeCollective(solver,index,levels):
+    """Use this function to write levels (time,variable,row,column) of this rank to the output dataset starting at time index.
+    The write is collective so every rank calls it, ranks without rows select nothing.
+    """
+    fileSpace = solver.data.id.get_space()
+    if levels.size:
+        memorySpace = h5py.h5s.create_simple(levels.shape)
+        fileSpace.select_hyperslab((index,0,solver.outputFileRows.start,solver.outputFileColumns.start),levels.shape)
+    else:
+        levels = numpy.zeros((1,),dtype=solver.dtype)
+        memorySpace = h5py.h5s.create_simple(levels.shape)
+        memorySpace.select_none()
+        fileSpace.select_none()
+    solver.data.id.write(memorySpace,fileSpace,numpy.ascontiguousarray(levels,dtype=solver.dtype),dxpl=solver.collectiveTransfer)
+
 def buildGPUSource(sourcefile):
     """Use this function to build the given and swept source module together.
     """
@@ -187,14 +774,20 @@ def standardWrite(cwt,solver):
     """Use this function to write standard data out."""
     solver.nodeComm.Barrier()
     #Write data and copy down a step
-    if (solver.globalTimeStep)%solver.intermediate==0 and solver.nodeMasterBool:
-        #Unpacking globalBlock
-        iv,ix,iy = solver.globalBlock #Unpack global tuple
-        solver.data[cwt,iv,ix,iy] = solver.sharedArray[solver.intermediate-1,:,solver.operating:-solver.operating,solver.operating:-solver.operating]
+    level = solver.sharedArray[solver.intermediate-1,:,solver.operating:-solver.operating,solver.operating:-solver.operating]
+    if (solver.globalTimeStep)%solver.intermediate==0:
+        recordDiagnostics(solver,cwt,level)
+    if (solver.globalTimeStep)%solver.intermediate==0 and solver.collectiveWrite:
+        if isKept(solver,cwt):
+            writeCollective(solver,cwt//solver.writeStride,level[None,solver.outputVariables,solver.outputRows,solver.outputColumns])
+        cwt+=1
+    elif (solver.globalTimeStep)%solver.intermediate==0 and solver.nodeMasterBool:
+        writeOutput(solver,cwt,level)
         cwt+=1
     solver.nodeComm.Barrier()
-    #Update CPU shared data
-    for block in solver.blocks:
+    #Update CPU shared data, blocks claimed by every rank are split evenly
+    blocks = solver.blocks[solver.nodeComm.Get_rank()::solver.nodeComm.Get_size()] if solver.workStealing else solver.blocks
+    for block in blocks:
         writeblock,readblock = block
         it,iv,ix,iy = writeblock
         for i in range(solver.intermediate):
@@ -1,5 +1,8 @@
-import numpy,GPUtil, os, time, warnings, mpi4py.MPI as MPI,traceback
+import numpy,GPUtil, os, time, warnings, hashlib, mpi4py.MPI as MPI,traceback
+from mpi4py.util import dtlib
+from concurrent.futures import ThreadPoolExecutor
 import pysweep.core.io as io
+import pysweep.core.geometry as geometry
 import socket
 
 def pseudoCluster(rank):
@@ -30,10 +33,20 @@ def cleanupProcesses(solver,start,stop):
     # Clean Up - Pop Cuda Contexts and Close Pool
     if solver.gpuBool:
         solver.cuda_context.pop()
+    if getattr(solver,"pool",None) is not None:
+        solver.pool.shutdown()
+    if solver.writer is not None:
+        solver.writer.close() #Flush staged output
+    for haloRequest in getattr(solver,"haloRequests",list()):
+        haloRequest.Free()
+    for haloType in getattr(solver,"haloTypes",dict()).values():
+        haloType.Free()
+    if getattr(solver,"counterWin",None) is not None:
+        solver.counterWin.Unlock_all()
+        solver.counterWin.Free()
     solver.comm.Barrier()
     clocktime = stop-start
-    solver.clocktime[0] = clocktime
-    solver.hdf5.close()
+    io.closeOutputFile(solver,clocktime)
     #Removing input file.
     if solver.clusterMasterBool:
         io.updateLogFile(solver,clocktime)
@@ -77,6 +90,55 @@ def getBlockBoundaries(Rows,Devices,nodeID,deviceType,multiplier):
     return getBound(multiplier[nodeID-1]),getBound(multiplier[nodeID])
 
 
+def getWeightedBoundaries(Rows,weights,nodeID):
+    """
+    Use this function to get block boundaries on each node when rows are split in proportion to weights, every node gets at least one row.
+    args:
+    Rows: number of global rows
+    weights: weight of every node, e.g., its measured speed
+    nodeID: node identifier
+    """
+    weights = numpy.asarray(weights,dtype=float)
+    assert Rows >= len(weights), "CPU: Problem with decomposition."
+    shares = 1+(Rows-len(weights))*weights/numpy.sum(weights)
+    counts = numpy.floor(shares).astype(int)
+    counts[numpy.argsort(counts-shares,kind="stable")[:int(Rows-numpy.sum(counts))]] += 1 #largest remainders get the remaining rows
+    bounds = numpy.concatenate(([0],numpy.cumsum(counts)))
+    return int(bounds[nodeID-1]),int(bounds[nodeID])
+
+def getMortonIndex(x,y):
+    """Use this function to get the position of block (x,y) on a Morton (Z order) curve by interleaving the bits of x and y."""
+    index = 0
+    for bit in range(max(x,y).bit_length()):
+        index |= ((x>>bit)&1)<<(2*bit+1)|((y>>bit)&1)<<(2*bit)
+    return index
+
+def getHilbertIndex(x,y,order):
+    """Use this function to get the position of block (x,y) on a Hilbert curve filling a square of side order, a power of two."""
+    index,s = 0,order//2
+    while s > 0:
+        rx,ry = int(x&s > 0),int(y&s > 0)
+        index += s*s*((3*rx)^ry)
+        if ry == 0: #Rotating the quadrant
+            if rx == 1:
+                x,y = order-1-x,order-1-y
+            x,y = y,x
+        s//=2
+    return index
+
+def getBlockOrder(solver,rows,columns):
+    """Use this function to get the (row,column) indices of the cpu blocks of a node in the order they are split across its ranks.
+    Blocks are listed column by column unless they are ordered along a morton or hilbert curve so that each rank gets a compact patch.
+    """
+    assert solver.blockOrder in ("column","morton","hilbert"), "Invalid block order, it must be column, morton, or hilbert."
+    indices = [(i,j) for j in range(columns) for i in range(rows)]
+    if solver.blockOrder == "morton":
+        indices.sort(key=lambda index: getMortonIndex(*index))
+    elif solver.blockOrder == "hilbert":
+        order = 1<<max(rows-1,columns-1,1).bit_length() #side of the smallest square curve covering the blocks
+        indices.sort(key=lambda index: getHilbertIndex(*index,order))
+    return indices
+
 def MinorSplit(solver,nodeInfo,gpuRank,adjustment):
     """
         This function splits the total number of blocks up on the node level 
@@ -89,20 +151,24 @@ def MinorSplit(solver,nodeInfo,gpuRank,adjustment):
     """
     ranksPerNode = solver.nodeComm.Get_size() #getting number of ranks per node
     gpuSize, cpuSize = nodeInfo
+    iv,ix,iy = solver.globalBlock
+    width = iy.stop-iy.start #number of columns of the node
+    yHalo = solver.blocksize[1]//2 if solver.simulation and solver.nodeGrid[1] > 1 else 0 #swept edge blocks reach into the y forward neighbor
     variableSlice = slice(0,solver.arrayShape[0],1)
     start = adjustment #Convert to actual array size
     intersection = int(gpuSize*solver.blocksize[0]+adjustment) #gpu-cpu intersection on a node
     stop = int((gpuSize+cpuSize)*solver.blocksize[0]+adjustment) #Convert to actual array size
     #Creating shared shape based on swept or not
-    solver.sharedShape = solver.arrayShape[0],stop+adjustment,solver.arrayShape[2]+2*adjustment 
+    solver.sharedShape = solver.arrayShape[0],stop+adjustment,width+2*adjustment+yHalo
     #total GPU slice of shared array
-    gpuBlock = variableSlice,slice(start,intersection,1),slice(adjustment,solver.arrayShape[-1]+adjustment,1) 
+    gpuBlock = variableSlice,slice(start,intersection,1),slice(adjustment,width+adjustment,1) 
     individualBlocks = list() #For CPU 
-    #Getting blocks
-    for j in range(adjustment,solver.arrayShape[-1]+adjustment,solver.blocksize[1]): #column for loop
-        for i in range(intersection,stop,solver.blocksize[0]):
-            currBlock = (variableSlice,slice(i,i+solver.blocksize[0],1),slice(j,j+solver.blocksize[0],1)) #Getting current block
-            individualBlocks.append(currBlock) #appending to individual blocks
+    #Getting blocks in the order they are split across ranks
+    rows = range(intersection,stop,solver.blocksize[0])
+    columns = range(adjustment,width+adjustment,solver.blocksize[1])
+    for i,j in getBlockOrder(solver,len(rows),len(columns)):
+        currBlock = (variableSlice,slice(rows[i],rows[i]+solver.blocksize[0],1),slice(columns[j],columns[j]+solver.blocksize[1],1)) #Getting current block
+        individualBlocks.append(currBlock) #appending to individual blocks
     #Splitting blocks
     dividedBlocks = numpy.array_split(individualBlocks,ranksPerNode) #-len(gpuRank) #Potentially add use some nodes for both CPU and GPU
     while len(gpuRank)<len(dividedBlocks):
@@ -137,6 +203,9 @@ def MajorSplit(solver,nodeID):
 
     """
     numOfNodes = solver.clusterComm.Get_size() #number of nodes in cluster
+    solver.nodeGrid = getNodeGrid(solver,numOfNodes)
+    xNodes,yNodes = solver.nodeGrid
+    xID,yID = divmod(nodeID-1,yNodes) #position of the node in the node grid
     gpuRank,numberOfGPUs = getGPUInfo(solver) #getting ranks with gpus and number
     #Assert that the total number of blocks is an integer
     assert (numpy.prod(solver.arrayShape[1:])/numpy.prod(solver.blocksize)).is_integer(), "Provided array dimensions is not divisible by the specified block size."
@@ -151,15 +220,23 @@ def MajorSplit(solver,nodeID):
     gpuRank,totalGPUs,numberOfGPUsList,numberOfGPUs = adjustGPURanks(solver,gpuRank,totalGPUs,numberOfGPUsList,numberOfGPUs,GPURows) #Use this function to remove GPUs if there are too many
     #multipliers for for boundaries
     gpuMult = [0]+[numberOfGPUsList[i]+sum(numberOfGPUsList[:i]) for i in range(len(numberOfGPUsList))] #GPU multipliers
-    cpuMult = numpy.arange(0,numOfNodes+1,1,dtype=numpy.intc) if solver.share < 1 else numpy.zeros(numOfNodes+1,dtype=numpy.intc) #CPU multipliers
+    cpuMult = numpy.arange(0,xNodes+1,1,dtype=numpy.intc) if solver.share < 1 else numpy.zeros(xNodes+1,dtype=numpy.intc) #CPU multipliers
     #Get gpu boundaries
     gpuLowerBound,gpuUpperBound = getBlockBoundaries(GPURows,totalGPUs,nodeID,"GPU",gpuMult)
     #Get cpu boundaries
-    cpuLowerBound,cpuUpperBound = getBlockBoundaries(CPURows,numOfNodes,nodeID,"CPU",cpuMult)
+    yBlocks = solver.arrayShape[2]//solver.blocksize[1]
+    if solver.nodeWeights is not None and CPURows >= xNodes: #rows and columns in proportion to the speed of the nodes sharing them
+        weights = numpy.reshape(solver.nodeWeights,(xNodes,yNodes))
+        cpuLowerBound,cpuUpperBound = getWeightedBoundaries(CPURows,numpy.sum(weights,axis=1),xID+1)
+        yLowerBound,yUpperBound = getWeightedBoundaries(yBlocks,numpy.sum(weights,axis=0),yID+1)
+    else:
+        cpuLowerBound,cpuUpperBound = getBlockBoundaries(CPURows,xNodes,xID+1,"CPU",cpuMult)
+        #Get column boundaries
+        yLowerBound,yUpperBound = getBlockBoundaries(yBlocks,yNodes,yID+1,"CPU",numpy.arange(0,yNodes+1,1,dtype=numpy.intc))
     #Compiling info into ranges and magnitudes
     start = int((gpuLowerBound+cpuLowerBound)*solver.blocksize[0])
     stop = int((gpuUpperBound+cpuUpperBound)*solver.blocksize[0])
-    solver.globalBlock = slice(0,solver.arrayShape[0],1),slice(start,stop,1),slice(0,solver.arrayShape[-1],1) #part of initial conditions for this node
+    solver.globalBlock = slice(0,solver.arrayShape[0],1),slice(start,stop,1),slice(int(yLowerBound*solver.blocksize[1]),int(yUpperBound*solver.blocksize[1]),1) #part of initial conditions for this node
     nodeInfo = gpuUpperBound-gpuLowerBound,cpuUpperBound-cpuLowerBound #low range, high range, gpu magnitude, cpu magnitude
     #Testing ranks and number of gpus to ensure simulation is viable
     assert totalGPUs > 0 if solver.share > 0 else True, "There are no avaliable GPUs"
@@ -174,12 +251,30 @@ def MajorSplit(solver,nodeID):
     adjustment = 0 if solver.simulation else solver.operating
     return MinorSplit(solver,nodeInfo,gpuRank,adjustment) 
 
+def getNodeGrid(solver,numOfNodes):
+    """Use this function to get the grid of nodes in x and y, the grid that divides the blocks with the fewest halo points per node is chosen unless one is given.
+    Nodes are only split in x with a gpu share since gpu blocks span the y direction of their node.
+    """
+    xBlocks = solver.arrayShape[1]//solver.blocksize[0]
+    yBlocks = solver.arrayShape[2]//solver.blocksize[1]
+    if solver.nodeGrid is not None:
+        xNodes,yNodes = (int(n) for n in solver.nodeGrid)
+        assert xNodes*yNodes == numOfNodes and xNodes <= xBlocks and yNodes <= yBlocks, "Invalid node grid, it must have one node for every node in the cluster and at least one block per node."
+        assert yNodes == 1 or solver.share == 0, "Nodes can only be split in y without a gpu share."
+        return xNodes,yNodes
+    grids = [(xNodes,numOfNodes//xNodes) for xNodes in range(numOfNodes,0,-1) if numOfNodes%xNodes==0 and xNodes<=xBlocks and numOfNodes//xNodes<=yBlocks]
+    if solver.share > 0 or not grids:
+        return numOfNodes,1
+    haloPoints = lambda grid: solver.arrayShape[2]/grid[1]+(solver.arrayShape[1]/grid[0] if grid[1] > 1 else 0) #x halos are always exchanged
+    return min(grids,key=haloPoints) #ties keep more nodes in x
+
 def getNeighborRanks(solver,nodeID):
-    #Get communicating ranks
-    ranks = [None,]+solver.clusterComm.allgather(solver.rank)
-    ranks[0] = ranks[-1] #Set first rank to last rank
-    ranks.append(ranks[1]) #Add first rank to end
-    return (ranks[nodeID-1],ranks[nodeID+1]) #communicating neighbors
+    """Use this function to get the cluster ranks of the back and forward neighbors of a node in x and in y, y neighbors are None if the nodes span y."""
+    xNodes,yNodes = solver.nodeGrid
+    xID,yID = divmod(nodeID-1,yNodes)
+    clusterRank = lambda i,j: int((i%xNodes)*yNodes+j%yNodes) #node ids are cluster ranks plus one
+    yNeighbors = (clusterRank(xID,yID-1),clusterRank(xID,yID+1)) if yNodes > 1 else None
+    return (clusterRank(xID-1,yID),clusterRank(xID+1,yID)),yNeighbors
 
 def setupCommunicators(solver):
     """Use this function to create MPI communicators for all ranks, node ranks, and cluster ranks
@@ -206,8 +301,73 @@ def setupCommunicators(solver):
     solver.clusterMasterBool = solver.rank == clusterMaster
 
 
+def getCalibrationKey(solver):
+    """Use this function to get the key of a calibration, throughput depends on the equation, blocks, dtype, ranks, and threads of a node."""
+    return "{},{},{},{},{},{},{}".format(io.getEquationName(solver.cpuStr),solver.blocksize[0],solver.operating,solver.intermediate,solver.dtype.name,solver.nodeComm.Get_size(),solver.threads)
+
+def calibrateNode(solver,duration=0.25):
+    """Use this function to measure the blocks per second a node solves with the cpu module, every rank of the node solves standard blocks with its threads for duration seconds.
+    The blocks are filled with the start of the initial conditions, so the step sees realistic values.
+    """
+    ops,bs,threads = solver.operating,solver.blocksize[0],max(solver.threads,1)
+    nv,nx,ny = solver.arrayShape
+    sample = numpy.asarray(solver.initialConditions[:,:min(nx,bs+2*ops),:min(ny,threads*bs+2*ops)])
+    sample = numpy.take(numpy.take(sample,numpy.arange(bs+2*ops),axis=1,mode="wrap"),numpy.arange(threads*bs+2*ops),axis=2,mode="wrap")
+    state = numpy.zeros((solver.intermediate+1,)+sample.shape,dtype=solver.dtype)
+    state[:] = sample
+    timeSlice,variableSlice = slice(0,state.shape[0],1),slice(0,nv,1)
+    blocks = [((timeSlice,variableSlice,slice(ops,bs+ops,1),slice(ops+i*bs,ops+(i+1)*bs,1)),(timeSlice,variableSlice,slice(0,bs+2*ops,1),slice(i*bs,(i+1)*bs+2*ops,1))) for i in range(threads)]
+    phase = geometry.Geometry()
+    phase.initializeCPU(solver.cpu,((slice(ops,bs+ops,1),slice(ops,bs+ops,1)),),solver.intermediate-1,state[blocks[0][1]].shape)
+    phase.setAdjustment(ops)
+    pool = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+    phase.setPool(pool)
+    solver.cpu.set_globals(*solver.globals)
+    solver.nodeComm.Barrier() #Ranks of a node are measured together
+    steps,start = 0,time.perf_counter()
+    with numpy.errstate(all="ignore"):
+        while steps < 3 or time.perf_counter()-start < duration:
+            phase.callStandardCPU(state,blocks,1+steps%solver.intermediate)
+            steps+=1
+    rate = threads*steps/(time.perf_counter()-start)
+    if pool is not None:
+        pool.shutdown()
+    return solver.nodeComm.allreduce(rate)
+
+def getNodeWeights(solver):
+    """Use this function to get the measured speed of every node for weighting the decomposition, or None if calibration is disabled.
+    Speeds are cached per hostname in the calibration file so nodes are only measured once for a configuration, every rank must call it.
+    """
+    if not solver.calibrate:
+        return None
+    hostname,key = MPI.Get_processor_name(),getCalibrationKey(solver)
+    cache = io.readCache(solver.calibrationFile) if solver.nodeMasterBool else dict()
+    speed = solver.nodeComm.bcast(cache.get(hostname,dict()).get(key))
+    measured = speed is None
+    if measured:
+        speed = calibrateNode(solver)
+    if not solver.nodeMasterBool:
+        return None
+    speeds = solver.clusterComm.allgather((hostname,float(speed),measured))
+    if solver.clusterMasterBool and any(measured for hostname,speed,measured in speeds):
+        io.updateCache(solver.calibrationFile,{hostname:{key:speed} for hostname,speed,measured in speeds if measured})
+    return [speed for hostname,speed,measured in speeds]
+
+def getHostSignature(solver):
+    """Use this function to get a short signature of the hosts the job runs on, every rank must call it."""
+    hostnames = sorted(set(solver.comm.allgather(MPI.Get_processor_name())))
+    return hashlib.sha1(",".join(hostnames).encode()).hexdigest()[:12]
+
+def getAutotuneCandidates(solver):
+    """Use this function to get the legal blocksizes of the domain, they satisfy BS = 2*ops*k with a swept pyramid of at least one step, divide the domain, and give every node a row."""
+    nv,nx,ny = solver.arrayShape
+    ops,numOfNodes = solver.operating,solver.comm.allreduce(1 if solver.nodeMasterBool else 0)
+    limit = 32 if solver.share > 0 else min(nx,ny) #gpu blocks are limited to 1024 threads
+    return [bs for bs in range(4*ops,limit+1,2*ops) if nx%bs == 0 and ny%bs == 0 and nx//bs >= numOfNodes]
+
 def setupProcesses(solver):
-    #Assumes all nodes have the same number of cores in CPU
+    #Nodes are assumed identical unless they are calibrated
+    solver.nodeWeights = getNodeWeights(solver)
     if solver.nodeMasterBool:
         #Giving each node an id
         if solver.clusterMasterBool:
@@ -218,18 +378,63 @@ def setupProcesses(solver):
         #Splitting data across cluster (Major)
         gpuBlock,blocks,gpuRank =  MajorSplit(solver,nodeID)
         #Getting neighboring ranks for communication
-        solver.neighbors = getNeighborRanks(solver,nodeID) 
+        solver.neighbors,solver.yNeighbors = getNeighborRanks(solver,nodeID) 
     else:
-       gpuRank,gpuBlock,solver.globalBlock,blocks,solver.sharedShape,solver.neighbors = None,None,None,None,None,None
+       gpuRank,gpuBlock,solver.globalBlock,blocks,solver.sharedShape,solver.neighbors,solver.yNeighbors,solver.nodeGrid = None,None,None,None,None,None,None,None
     #Broadcasting gpu information
     solver.blocks = solver.nodeComm.scatter(blocks)
+    if solver.workStealing: #Every rank claims from all blocks of the node
+        solver.blocks = solver.nodeComm.bcast([block for rankBlocks in blocks for block in rankBlocks] if solver.nodeMasterBool else None)
     solver.gpuRank = solver.nodeComm.scatter(gpuRank)
     solver.gpuBlock = solver.nodeComm.bcast(gpuBlock) #total gpu block in shared array
     solver.share = solver.nodeComm.bcast(solver.share) #update effective share
     solver.globalBlock = solver.nodeComm.bcast(solver.globalBlock) #total cpu block in shared array
     solver.sharedShape = solver.nodeComm.bcast(solver.sharedShape) #shape of node shared array
+    solver.nodeGrid = solver.nodeComm.bcast(solver.nodeGrid) #nodes in x and y
+    solver.yNeighbors = solver.nodeComm.bcast(solver.yNeighbors) #y neighbors if nodes are split in y
     solver.gpuBool = True if solver.gpuRank is not None else False
     
     #----------------------Warning Empty MPI Processes------------------------#
     if len(solver.blocks)==0 and not solver.gpuBool:
         warnings.warn('rank {} was not given any CPU blocks to solve and does not have any GPUs available.'.format(solver.rank))
+
+def createSlabType(solver,start,size):
+    """Use this function to create a committed MPI datatype for the x slab [start,start+size) of the node shared array."""
+    sizes = list(solver.sharedShape)
+    subsizes = sizes[:2]+[size,]+sizes[3:]
+    return dtlib.from_numpy_dtype(solver.dtype).Create_subarray(sizes,subsizes,[0,0,start,0]).Commit()
+
+def createColumnType(solver,start,size):
+    """Use this function to create a committed MPI datatype for the y slab [start,start+size) of the node shared array."""
+    sizes = list(solver.sharedShape)
+    subsizes = sizes[:3]+[size,]
+    return dtlib.from_numpy_dtype(solver.dtype).Create_subarray(sizes,subsizes,[0,0,0,start]).Commit()
+
+def setupHaloExchange(solver):
+    """Use this function to precompute the datatypes and buffers used by node masters to exchange halos.
+    Slabs are sent from and received into the shared array, swept nodes replace the last splitx rows of their x ring.
+    On a node grid split in y, swept nodes receive the first splity columns of their y forward neighbor after their own columns and standard nodes exchange y halos.
+    """
+    if solver.nodeMasterBool:
+        nx = solver.sharedShape[2]
+        iv,ix,iy = solver.globalBlock
+        width = iy.stop-iy.start
+        if solver.simulation:
+            solver.haloTypes = {"ring":createSlabType(solver,nx-solver.splitx,solver.splitx)}
+            if solver.yNeighbors is not None:
+                solver.haloTypes.update({"edge":createColumnType(solver,0,solver.splity),"yHalo":createColumnType(solver,width,solver.splity)})
+        else:
+            ops = solver.operating
+            solver.haloTypes = {"forward":createSlabType(solver,nx-2*ops,ops),"backward":createSlabType(solver,ops,ops),"front":createSlabType(solver,0,ops),"back":createSlabType(solver,nx-ops,ops)}
+            if solver.yNeighbors is not None:
+                solver.haloTypes.update({"yForward":createColumnType(solver,width,ops),"yBackward":createColumnType(solver,ops,ops),"yFront":createColumnType(solver,0,ops),"yBack":createColumnType(solver,width+ops,ops)})
+
+def createHaloRequests(solver):
+    """Use this function to create the persistent requests that exchange standard halos in place without blocking."""
+    if solver.nodeMasterBool:
+        back,forward = solver.neighbors
+        haloBuffer = lambda key: [solver.sharedArray,1,solver.haloTypes[key]]
+        solver.haloRequests = [solver.clusterComm.Recv_init(haloBuffer("front"),source=back,tag=0),
+                                solver.clusterComm.Recv_init(haloBuffer("back"),source=forward,tag=1),
+                                solver.clusterComm.Send_init(haloBuffer("forward"),dest=forward,tag=0),
+                                solver.clusterComm.Send_init(haloBuffer("backward"),dest=back,tag=1)]
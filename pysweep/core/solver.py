@@ -1,10 +1,9 @@
-import sys, os, yaml, numpy, warnings, time, h5py, importlib.util
+import sys, os, copy, glob, yaml, numpy, warnings, time, h5py, importlib.util
 import GPUtil
 import pysweep.core.io as io
 import pysweep.core.process as process
 import pysweep.core.functions as functions
 import pysweep.core.block as block
-from itertools import cycle
 
 class Solver(object):
     """docstring for Solver."""
@@ -12,6 +11,34 @@ class Solver(object):
         super(Solver, self).__init__()
         self.moments = [time.time(),]
         process.setupCommunicators(self) #This function creates necessary variables for MPI to use
+        #Optional settings that yaml or manual input may overwrite
+        self.inPlace = True #solve slice blocks directly in the shared array
+        self.threads = 1 #threads each cpu rank uses to solve its blocks
+        self.overlap = False #solve interior standard blocks while halos are exchanged
+        self.asyncWrite = False #write output from a background thread on node masters
+        self.writeBuffers = 8 #time levels staged for the background writer
+        self.collectiveWrite = False #all ranks write output in collective hyperslab writes
+        self.chunks = None #output chunk layout, block, slab, or a chunk shape
+        self.compression = None #output compression filter, e.g., gzip or lzf
+        self.compressionLevel = 4 #gzip compression level
+        self.writeStride = 1 #write every nth time level, none if 0
+        self.writeVariables = None #indices of the variables to write, all if None
+        self.writeRegion = None #region [[x0,x1],[y0,y1]] of the domain to write, all if None
+        self.checkpointInterval = 0 #swept cycles or standard steps between checkpoints, none if 0
+        self.checkpointFile = None #checkpoint file, derived from the output file if None
+        self.restart = False #continue from the checkpoint file
+        self.shardedOutput = False #node masters write their own output files joined by a virtual dataset
+        self.reductions = dict() #reductions of every time level, name: [operation,variable] or (function,operation)
+        self.probes = list() #points [x,y] whose variables are recorded every time level
+        self.diagnosticsFile = None #file of the reductions and probes, derived from the output file if None
+        self.nodeGrid = None #nodes in x and y, chosen from the number of nodes and the domain if None
+        self.calibrate = False #split rows in proportion to the measured speed of each node
+        self.calibrationFile = "calibration.yaml" #file the measured speeds are cached in per hostname
+        self.blockOrder = "column" #order of the blocks split across the ranks of a node, column, morton, or hilbert
+        self.workStealing = False #ranks of a node claim cpu blocks from a shared counter in every phase
+        self.autotune = False #choose the fastest simulation type and blocksize from short trial runs
+        self.autotuneFile = "autotune.yaml" #file the autotuned choices are cached in per hosts
+        self.logFile = "log.db" #run log database the cluster master appends the run to
         self.assignInitialConditions(initialConditions,sendWarning=sendWarning)
 
         if yamlFileName is not None:
@@ -24,6 +51,9 @@ class Solver(object):
 
     def __call__(self,start=0,stop=-1,libname=None,recompile=False):
         """Use this function to spawn processes."""
+        if self.autotune:
+            io.verbosePrint(self,"Autotuning simulation and blocksize...\n")
+            self.autotuneSolver()
         #Grabbing start of call time
         self.moments.append(time.time())
         io.verbosePrint(self,"-----------------------------PySweep-------------------------\n")
@@ -35,10 +65,13 @@ class Solver(object):
         #Creating time step data
         io.verbosePrint(self,'Creating time step data...\n')
         self.createTimeStepData()
+        process.setupHaloExchange(self)
         self.moments.append(time.time())
 
         #Creating simulatneous input and output file
         io.verbosePrint(self,'Creating output file...\n')
+        if self.checkpointFile is None:
+            self.checkpointFile = os.path.splitext(self.output)[0]+"Checkpoint.hdf5"
         io.createOutputFile(self)
         self.moments.append(time.time())
         
@@ -81,10 +114,57 @@ class Solver(object):
         print(shortPrint)
 
     def loadCPUModule(self):
-        """Use this function to set the cpu module externally."""
+        """Use this function to set the cpu module externally, the node master loads it first so compiled kernels are cached once per node."""
         spec = importlib.util.spec_from_file_location("module.step", self.cpu)
         self.cpu  = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(self.cpu)    
+        sys.modules[spec.name] = self.cpu #compiled functions must be able to find their module when loaded from cache
+        if self.nodeMasterBool:
+            spec.loader.exec_module(self.cpu)
+        self.nodeComm.Barrier()
+        if not self.nodeMasterBool:
+            spec.loader.exec_module(self.cpu)
+
+    def autotuneSolver(self):
+        """Use this function to set the fastest simulation type and blocksize measured in short trial runs of every legal blocksize.
+        The choice is cached by equation, shape, ranks, hosts, and the options that change run times in the autotune file so later runs use it without trials.
+        """
+        hosts = process.getHostSignature(self)
+        nodeGrid = "auto" if self.nodeGrid is None else "x".join(str(n) for n in self.nodeGrid)
+        key = "{},{},{},{},{},{},{} ranks,{} threads,{},grid {},{},{}".format(io.getEquationName(self.cpuStr),"x".join(str(n) for n in self.arrayShape),self.operating,self.intermediate,self.share,self.dtype.name,self.comm.Get_size(),self.threads,self.blockOrder,nodeGrid,"in place" if self.inPlace else "copied","calibrated" if self.calibrate else "uniform")
+        choice = io.readCache(self.autotuneFile).get(hosts,dict()).get(key) if self.clusterMasterBool else None
+        choice = self.comm.bcast(choice)
+        if choice is None:
+            times = dict()
+            for blocksize in process.getAutotuneCandidates(self):
+                for simulation in (True,False):
+                    times[("swept" if simulation else "standard",blocksize)] = self.runTrial(simulation,blocksize)
+            name,blocksize = min(times,key=times.get)
+            choice = {"swept":name=="swept","blocksize":blocksize,"seconds per step":{"{},{}".format(*trial):seconds for trial,seconds in times.items()}}
+            if self.clusterMasterBool:
+                io.updateCache(self.autotuneFile,{hosts:{key:choice}})
+        self.simulation = choice["swept"]
+        self.blocksize = (choice["blocksize"],choice["blocksize"],1)
+
+    def runTrial(self,simulation,blocksize):
+        """Use this function to get the seconds per time step of a short run with the given simulation type and blocksize, its output is written to scratch files that are removed."""
+        trial = copy.copy(self)
+        trial.moments = [time.time(),]
+        trial.simulation,trial.blocksize = simulation,(blocksize,blocksize,1)
+        trial.globals = list(self.globals)
+        trial.globals[1] = trial.globals[0]+4*(blocksize//(2*self.operating))*trial.globals[2] #enough steps for a few swept cycles
+        trial.output = os.path.splitext(self.output)[0]+"Autotune.hdf5"
+        trial.checkpointFile,trial.diagnosticsFile = None,None
+        trial.autotune,trial.verbose,trial.restart,trial.checkpointInterval = False,False,False,0
+        trial.reductions,trial.probes,trial.logFile = dict(),list(),None
+        trial.hf = None #The input file stays open for the run
+        trial()
+        trial.win.Free() #Trial shared arrays are not used again
+        secondsPerStep = max(self.comm.allgather(trial.moments[-1]-trial.moments[-2]))/trial.timeSteps
+        if self.clusterMasterBool:
+            for scratchFile in glob.glob(os.path.splitext(trial.output)[0]+"*"):
+                os.remove(scratchFile)
+        self.comm.Barrier()
+        return secondsPerStep
 
     def assignInitialConditions(self,initialConditions,sendWarning=True):
         """Use this function to optionally assign initial conditions as an hdf5 file, array, or throw warning."""
@@ -160,30 +240,47 @@ class Solver(object):
         # -------------------------------SWEPT RULE---------------------------------------------#
         #setting global time step to zero
         self.globalTimeStep=1 #Has to be int32 for GPU
-        # -------------------------------FIRST PRISM AND COMMUNICATION-------------------------------------------#
-        functions.FirstPrism(self)
-        functions.firstForward(self)
-        #Loop variables
-        cwt = 1 #Current write time
+        if self.restart:
+            cwt,first = functions.restartSwept(self)
+        else:
+            # -------------------------------FIRST PRISM AND COMMUNICATION-------------------------------------------#
+            functions.FirstPrism(self)
+            functions.firstForward(self)
+            #Loop variables
+            cwt = 1 #Current write time
+            first = 0
         del self.Up #Deleting Up object after FirstPrism
         #-------------------------------SWEPT LOOP--------------------------------------------#
-        step = cycle([functions.sendBackward,functions.sendForward])
-        for i in range(self.maxGlobalSweptStep):
+        step = (functions.sendBackward,functions.sendForward)
+        for i in range(first,self.maxGlobalSweptStep):
             functions.UpPrism(self)
-            cwt = next(step)(cwt,self)
+            cwt = step[i%2](cwt,self)
+            if io.checkpointDue(self,i+1) and i+1 < self.maxGlobalSweptStep:
+                io.writeCheckpoint(self,cwt,i+1)
         #Do LastPrism Here then Write all of the remaining data
         functions.LastPrism(self)
-        next(step)(cwt,self)
+        step[self.maxGlobalSweptStep%2](cwt,self)
 
     def standardSolve(self):
         # -------------------------------Standard Decomposition---------------------------------------------#
         #setting global time step to zero
         self.globalTimeStep=1
+        cwt = 0 #Starts at zero compared too swept because of the write algorithm
+        first = 0
+        if self.restart:
+            cwt,first,self.globalTimeStep,timeBase = io.readCheckpoint(self)
         #Send Boundary points
         functions.sendEdges(self)
-        cwt = 0 #Starts at zero compared too swept because of the write algorithm
-        for i in range(self.intermediate*(self.timeSteps+1)):
+        steps = self.intermediate*(self.timeSteps+1)
+        for i in range(first,steps):
             functions.StandardFunction(self)
             cwt = io.standardWrite(cwt,self)
+            if io.checkpointDue(self,i+1) and i+1 < steps:
+                io.writeCheckpoint(self,cwt,i+1) #Halos are exchanged again on restart
             #Communicate
-            functions.sendEdges(self)
+            if self.overlap:
+                functions.startEdges(self)
+            else:
+                functions.sendEdges(self)
+        if self.overlap:
+            functions.finishEdges(self) #Complete the exchange started by the final step
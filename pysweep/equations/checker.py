@@ -1,7 +1,8 @@
 #Programmer: Anthony Walker
 #This file contains a test step function for debugging the swept rule
 
-import numpy, h5py, mpi4py.MPI as MPI
+import numpy
+from pysweep.utils.generateInput import generateInitialConditions
 try:
     import pycuda.driver as cuda
     from pycuda.compiler import SourceModule
@@ -20,6 +21,28 @@ def step(state,iidx,arrayTimeIndex,globalTimeStep):
     else:
         checkerTwoStep(state,iidx,arrayTimeIndex,globalTimeStep)
 
+def stepRegion(state,region,arrayTimeIndex,globalTimeStep):
+    """This is the vectorized method that will be called by the swept solver if it exists.
+    state - 4D numpy array(t,v,x,y (v is variables length))
+    region -  a tuple of x and y slices bounding the points to update
+    arrayTimeIndex - the current time step
+    globalTimeStep - a step counter that allows implementation of the scheme
+    """
+    checkerRegion(state,region,arrayTimeIndex,globalTimeStep)
+
+def checkerRegion(state,region,arrayTimeIndex,globalTimeStep):
+    """Use this function as the checker pattern over a region, it is the same for one and two steps."""
+    vs = slice(0,state.shape[1],1)
+    xc,yc = region
+    xw,xe = slice(xc.start-1,xc.stop-1,1),slice(xc.start+1,xc.stop+1,1)
+    ys,yn = slice(yc.start-1,yc.stop-1,1),slice(yc.start+1,yc.stop+1,1)
+    ntidx = (arrayTimeIndex+1,vs,xc,yc)  #next step index
+    state[ntidx] = state[arrayTimeIndex,vs,xe,yc]
+    state[ntidx] += state[arrayTimeIndex,vs,xw,yc]
+    state[ntidx] += state[arrayTimeIndex,vs,xc,yn]
+    state[ntidx] += state[arrayTimeIndex,vs,xc,ys]
+    state[ntidx] /= 4
+
 def checkerOneStep(state,iidx,arrayTimeIndex,globalTimeStep):
     """Use this function as the one step checker pattern"""
     vs = slice(0,state.shape[1],1)
@@ -44,17 +67,7 @@ def checkerTwoStep(state,iidx,arrayTimeIndex,globalTimeStep):
 
 def createInitialConditions(nv,nx,ny,filename="checkerConditions.hdf5"):
     """Use this function to create a set of initial conditions in an hdf5 file."""
-    comm = MPI.COMM_WORLD
-    data = numpy.zeros((nv,nx,ny))
-    for i in range(0,nx,2):
-        for j in range(0,ny,2):
-            data[:,i,j]=1
-    for i in range(1,nx,2):
-        for j in range(1,ny,2):
-            data[:,i,j]=1
-    with h5py.File(filename,"w",driver="mpio",comm=comm) as hf:
-        hf.create_dataset("data",data.shape,data=data)
-    return filename
+    return generateInitialConditions(lambda I,J:(I+J+1)%2,nv,nx,ny,xRange=(0,nx),yRange=(0,ny),filename=filename) #points are indices
 
 def set_globals(*args,source_mod=None):
     """Use this function to set cpu global variables"""
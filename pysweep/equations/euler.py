@@ -2,7 +2,8 @@
 #This file contains functions to solve the eulers equations in 2 dimensions with
 #the swept rule or in a standard way
 
-import sys,itertools,numpy,h5py,mpi4py.MPI as MPI, pysweep.equations.sodShock as sod
+import sys,itertools,numpy, pysweep.equations.sodShock as sod
+from pysweep.utils.generateInput import generateInitialConditions
 try:
     import pycuda.driver as cuda
 except Exception as e:
@@ -37,26 +38,8 @@ def createInitialConditions(npx,npy,t=0,gamma=1.4,filename="eulerConditions.hdf5
     npy: number of points in y
     t: time of initial conditions
     """
-    comm = MPI.COMM_WORLD
-    rank = comm.Get_rank()
-    if rank == 0:
-        L = 5 #From shu
-        X = numpy.linspace(-L,L,npx,endpoint=False)
-        Y = numpy.linspace(-L,L,npy,endpoint=False)
-        combos = [(i,j,x,y) for i,x in enumerate(X) for j,y in enumerate(Y)]
-        combos = numpy.array_split(combos,comm.Get_size())
-    else:
-        combos = None
-    combos = comm.scatter(combos)
-    with h5py.File(filename,"w",driver="mpio",comm=comm) as hf:
-        initialConditions = hf.create_dataset("data",(4,npx,npy))
-        for cmb in combos:
-            i,j,x,y = cmb
-            i = int(i)
-            j = int(j)
-            initialConditions[:,i,j] = analytical(x,y,t,gamma=gamma)
-    comm.Barrier()
-    return filename
+    L = 5 #From shu
+    return generateInitialConditions(lambda X,Y:analytical(X,Y,t,gamma=gamma),4,npx,npy,xRange=(-L,L),yRange=(-L,L),filename=filename,dtype=numpy.float32)
 
     
 def analytical(x,y,t,gamma=1.4,alpha=numpy.pi/4):
@@ -105,14 +88,11 @@ def analytical(x,y,t,gamma=1.4,alpha=numpy.pi/4):
 
 def getAnalyticalArray(npx,npy,t):
     """Use this function to get an analytical array for testing."""
-    state =numpy.zeros((4,npx,npy))
     L = 5 #From shu
     xRange = numpy.linspace(-L,L,npx,endpoint=False)
     yRange = numpy.linspace(-L,L,npy,endpoint=False)
-    for i,x in enumerate(xRange):
-        for j,y in enumerate(yRange):
-            state[:,i,j] = analytical(x,y,t,gamma=gamma)
-    return state
+    X,Y = numpy.meshgrid(xRange,yRange,indexing="ij")
+    return numpy.array(analytical(X,Y,t,gamma=gamma))
 
 def getPeriodicShock(npx,t,direc=True):
     """Use this function to test against the sod shock tube in 2D.
@@ -133,48 +113,73 @@ def step(state,iidx,arrayTimeIndex,globalTimeStep):
     iidx -  an iterable of indexs
     arrayTimeIndex - the current time step
     globalTimeStep - a step counter that allows implementation of the scheme
+    The update is found over the rectangle bounding iidx and only the points of iidx are written.
+    """
+    iidx = numpy.asarray(iidx)
+    idx,idy = iidx[:,0],iidx[:,1]
+    xl,yl = numpy.amin(iidx,axis=0)
+    xu,yu = numpy.amax(iidx,axis=0)+1
+    update = getUpdate(state,(slice(xl,xu,1),slice(yl,yu,1)),arrayTimeIndex,globalTimeStep)
+    state[arrayTimeIndex+1][:,idx,idy] = update[:,idx-xl,idy-yl]
+
+def stepRegion(state,region,arrayTimeIndex,globalTimeStep):
+    """This is the vectorized method that will be called by the swept solver if it exists.
+    state - 4D numpy array(t,v,x,y (v is variables length))
+    region -  a tuple of x and y slices bounding the points to update
+    arrayTimeIndex - the current time step
+    globalTimeStep - a step counter that allows implementation of the scheme
     """
+    xs,ys = region
+    state[arrayTimeIndex+1,:,xs,ys] = getUpdate(state,region,arrayTimeIndex,globalTimeStep)
+
+def getUpdate(state,region,arrayTimeIndex,globalTimeStep):
+    """Use this function to get the next time level of a region with whole array operations."""
     ops=2 #number of points on each side of a give point
-    #Finding pressure
-    pressure  = getPressureArray(state[arrayTimeIndex],iidx) #For use with swept
+    xs,ys = region
+    padded = getPaddedState(state[arrayTimeIndex],region,ops)
+    #Finding pressure once for the time level
+    pressure = getPressure(padded)
     #Solving fluxes
+    fluxx = getFluxInX(padded,pressure,ops)
+    fluxy = getFluxInY(padded,pressure,ops)
     if globalTimeStep%2==0: #RK2 step
-        fluxx = getFluxInX(state[arrayTimeIndex],pressure,iidx,ops)
-        fluxy = getFluxInY(state[arrayTimeIndex],pressure,iidx,ops)
-        for idx,idy in iidx:
-            state[arrayTimeIndex+1,:,idx,idy] = state[arrayTimeIndex-1,:,idx,idy]+(fluxx[:,idx,idy]*dtdx+fluxy[:,idx,idy]*dtdy)
+        return state[arrayTimeIndex-1,:,xs,ys]+(fluxx*dtdx+fluxy*dtdy)
     else: #intermediate step
-        fluxx = getFluxInX(state[arrayTimeIndex],pressure,iidx,ops)
-        fluxy = getFluxInY(state[arrayTimeIndex],pressure,iidx,ops)
-        for idx,idy in iidx:
-            state[arrayTimeIndex+1,:,idx,idy] = state[arrayTimeIndex,:,idx,idy]+0.5*(fluxx[:,idx,idy]*dtdx+fluxy[:,idx,idy]*dtdy)
-            
+        return state[arrayTimeIndex,:,xs,ys]+0.5*(fluxx*dtdx+fluxy*dtdy)
+
 #---------------------------------------------Solving functions
 
-def getXStencil(idx,idy,maxLen):
-    return ((idx-2)%maxLen,idy),((idx-1)%maxLen,idy),(idx,idy),((idx+1)%maxLen,idy),((idx+2)%maxLen,idy)
+def getPaddedState(state,region,ops):
+    """Use this function to get a region of state (v,x,y) padded by ops points on each side.
+    This is a view unless the padding crosses an edge, in which case it is wrapped periodically.
+    """
+    xs,ys = region
+    nv,nx,ny = state.shape
+    if xs.start >= ops and ys.start >= ops and xs.stop+ops <= nx and ys.stop+ops <= ny:
+        return state[:,xs.start-ops:xs.stop+ops,ys.start-ops:ys.stop+ops]
+    padded = numpy.take(state,numpy.arange(xs.start-ops,xs.stop+ops),axis=1,mode='wrap')
+    return numpy.take(padded,numpy.arange(ys.start-ops,ys.stop+ops),axis=2,mode='wrap')
+
+def getXStencil(shape,ops):
+    """Use this function to get the ww, w, c, e, and ee slices of the region inside a padded array shape (x,y)."""
+    nx,ny = shape
+    ys = slice(ops,ny-ops,1)
+    return tuple((slice(ops+i,nx-ops+i,1),ys) for i in range(-2,3,1))
 
-def getFluxInX(state,P,iidx,ops):
-    """Use this function to get flux in the X direction."""
-    flux = numpy.zeros((state.shape[0],state.shape[1],state.shape[2]))
-    xlen = state.shape[1]
+def getFluxInX(state,P,ops):
+    """Use this function to get flux in the X direction over the region inside a padded state."""
     vs = slice(0,4,1)
+    ww,w,c,e,ee = getXStencil(P.shape,ops)
     #west part of stencil
-    for idx,idy in iidx:
-        ww,w,c,e,ee = getXStencil(idx,idy,xlen)
-        left = fluxLimiter(state,(vs,)+w,(vs,)+c,P[c]-P[w],P[w]-P[ww])
-        right = fluxLimiter(state,(vs,)+c,(vs,)+w,P[c]-P[w],P[e]-P[c])
-        flux[:,idx,idy] += evaluateFluxInX(left,right)
-        flux[:,idx,idy] += evaluateSpectral(left,right
-        ,True)
-
+    left = fluxLimiter(state,(vs,)+w,(vs,)+c,P[c]-P[w],P[w]-P[ww])
+    right = fluxLimiter(state,(vs,)+c,(vs,)+w,P[c]-P[w],P[e]-P[c])
+    flux = evaluateFluxInX(left,right)
+    flux += evaluateSpectral(left,right,True)
     #east part of stencil
-    for idx,idy in iidx:
-        ww,w,c,e,ee = getXStencil(idx,idy,xlen)
-        left = fluxLimiter(state,(vs,)+c,(vs,)+e,P[e]-P[c],P[c]-P[w])
-        right = fluxLimiter(state,(vs,)+e,(vs,)+c,P[e]-P[c],P[ee]-P[e])
-        flux[:,idx,idy] -= evaluateFluxInX(left,right)
-        flux[:,idx,idy] -= evaluateSpectral(left,right,True)
+    left = fluxLimiter(state,(vs,)+c,(vs,)+e,P[e]-P[c],P[c]-P[w])
+    right = fluxLimiter(state,(vs,)+e,(vs,)+c,P[e]-P[c],P[ee]-P[e])
+    flux -= evaluateFluxInX(left,right)
+    flux -= evaluateSpectral(left,right,True)
     return flux*0.5
 
 def evaluateFluxInX(left_state,right_state):
@@ -195,30 +200,26 @@ def evaluateFluxInX(left_state,right_state):
     flux[3] = (left_state[3]+PL)*left_state[1]/left_state[0]+(right_state[3]+PR)*right_state[1]/right_state[0]
     return flux
 
-def getYStencil(idx,idy,maxLen):
-    return (idx,(idy-2)%maxLen),(idx,(idy-1)%maxLen),(idx,idy),(idx,(idy+1)%maxLen),(idx,(idy+2)%maxLen)
+def getYStencil(shape,ops):
+    """Use this function to get the ss, s, c, n, and nn slices of the region inside a padded array shape (x,y)."""
+    nx,ny = shape
+    xs = slice(ops,nx-ops,1)
+    return tuple((xs,slice(ops+i,ny-ops+i,1)) for i in range(-2,3,1))
 
-def getFluxInY(state,P,iidx,ops):
-    """Use this function to get flux in the X direction."""
-    flux = numpy.zeros((state.shape[0],state.shape[1],state.shape[2]))
-    ylen = state.shape[2]
+def getFluxInY(state,P,ops):
+    """Use this function to get flux in the Y direction over the region inside a padded state."""
     vs = slice(0,4,1)
-    #west part of stencil
-    for idx,idy in iidx:
-        ss,s,c,n,nn = getYStencil(idx,idy,ylen)
-        left = fluxLimiter(state,(vs,)+s,(vs,)+c,P[c]-P[s],P[s]-P[ss])
-        right = fluxLimiter(state,(vs,)+c,(vs,)+s,P[c]-P[s],P[n]-P[c])
-        flux[:,idx,idy] += evaluateFluxInY(left,right)
-        flux[:,idx,idy] += evaluateSpectral(left,right,False)
-
-    #east part of stencil
-    for idx,idy in iidx:
-        ss,s,c,n,nn = getYStencil(idx,idy,ylen)
-        left = fluxLimiter(state,(vs,)+c,(vs,)+n,P[n]-P[c],P[c]-P[s])
-        right = fluxLimiter(state,(vs,)+n,(vs,)+c,P[n]-P[c],P[nn]-P[n])
-        flux[:,idx,idy] -= evaluateFluxInY(left,right)
-        flux[:,idx,idy] -= evaluateSpectral(left,right,False)
-        
+    ss,s,c,n,nn = getYStencil(P.shape,ops)
+    #south part of stencil
+    left = fluxLimiter(state,(vs,)+s,(vs,)+c,P[c]-P[s],P[s]-P[ss])
+    right = fluxLimiter(state,(vs,)+c,(vs,)+s,P[c]-P[s],P[n]-P[c])
+    flux = evaluateFluxInY(left,right)
+    flux += evaluateSpectral(left,right,False)
+    #north part of stencil
+    left = fluxLimiter(state,(vs,)+c,(vs,)+n,P[n]-P[c],P[c]-P[s])
+    right = fluxLimiter(state,(vs,)+n,(vs,)+c,P[n]-P[c],P[nn]-P[n])
+    flux -= evaluateFluxInY(left,right)
+    flux -= evaluateSpectral(left,right,False)
     return flux*0.5
 
 def evaluateFluxInY(left_state,right_state):
@@ -247,11 +248,14 @@ def evaluateFluxInY(left_state,right_state):
 #         return state[idx1]
 
 def fluxLimiter(state,idx1,idx2,num,den):
-    """This function computers the minmod flux limiter based on pressure ratio"""
+    """This function computers the minmod flux limiter based on pressure ratio
+    num and den may be scalars or arrays matching the points of idx1 and idx2.
+    """
     #Try to form pressure ratio
-    Pr = num/den
-    Pr = 0 if numpy.isnan(Pr) or numpy.isinf(Pr) or Pr > 1e6 or Pr < 0 else num/den
-    tempState = state[idx1]+min(Pr,1)/2*(state[idx2]-state[idx1])
+    with numpy.errstate(divide='ignore',invalid='ignore'):
+        Pr = numpy.divide(num,den)
+    Pr = numpy.where(numpy.isfinite(Pr)&(Pr<=1e6)&(Pr>=0),Pr,0)
+    tempState = state[idx1]+numpy.minimum(Pr,1)/2*(state[idx2]-state[idx1])
     return tempState
 
 def evaluateSpectral(left_state,right_state,xy):
@@ -276,8 +280,9 @@ def evaluateSpectral(left_state,right_state,xy):
     spvec = (spec_state[0],spec_state[0]*spec_state[1],spec_state[0]*spec_state[2],spec_state[0]*spec_state[3])
     P = getPressure(spvec)
     dim = 1 if xy else 2    #if true provides u dim else provides v dim
-    spectralRadius = (numpy.sqrt(gamma*P/spec_state[0])+abs(spec_state[dim]))
-    spectralRadius = 0 if numpy.isnan(spectralRadius) else spectralRadius #sets spectral radius to zero if it's nan
+    with numpy.errstate(invalid='ignore'):
+        spectralRadius = (numpy.sqrt(gamma*P/spec_state[0])+numpy.abs(spec_state[dim]))
+    spectralRadius = numpy.where(numpy.isnan(spectralRadius),0,spectralRadius) #sets spectral radius to zero if it's nan
     return  spectralRadius*(left_state-right_state)#Returns the spectral radius *(dQ)
 
 def getPressure(q):
@@ -290,23 +295,3 @@ def getPressure(q):
     P = (GAMMA-1)*(rho*e-(1/2)*(rho*u^2+rho*v^2))
     """
     return gM1*(q[3]-(q[1]*q[1]+q[2]*q[2])/(2*q[0]))
-
-def getPressureArray(state,iidx):
-    """Use this function to solve for pressure of the 2D Eulers equations.
-    q is set up as:
-    q[0] = rho
-    q[1] = rho*u
-    q[2] = rho*v
-    q[3] = rho*e
-    P = (GAMMA-1)*(rho*e-(1/2)*(rho*u^2+rho*v^2))
-    """
-    ops = 2
-    pressure = numpy.zeros(state.shape[1:])
-    lB = numpy.amin(iidx) #lower bound
-    uB = numpy.amax(iidx) #upper bound
-    lB = lB-ops if lB>=ops else lB
-    uB = uB+ops if uB<(state.shape[-1]-1) else uB #Must adjust this for pseudo 1D debugging
-    for i in range(lB,uB+1,1):
-        for j in range(lB,uB+1,1): 
-            pressure[i,j] = gM1*(state[3,i,j]-(state[1,i,j]*state[1,i,j]+state[2,i,j]*state[2,i,j])/(2*state[0,i,j]))
-    return pressure
\ No newline at end of file
@@ -0,0 +1,24 @@
+#Programmer: Anthony Walker
+#This file contains a numba compiled step for the euler equations, the remaining functions are those of euler.py
+#Kernels are compiled when pysweep.equations.jit is imported and cached on disk (see NUMBA_CACHE_DIR)
+from pysweep.equations.jit import eulerKernel
+import pysweep.equations.euler as euler
+from pysweep.equations.euler import createInitialConditions, analytical, getAnalyticalArray, getPeriodicShock, getShock
+
+def step(state,iidx,arrayTimeIndex,globalTimeStep):
+    """This is the point method, it is not compiled and only used if stepRegion is not."""
+    euler.step(state,iidx,arrayTimeIndex,globalTimeStep)
+
+def stepRegion(state,region,arrayTimeIndex,globalTimeStep):
+    """This is the compiled method that will be called by the swept solver.
+    state - 4D float64 numpy array(t,v,x,y (v is variables length))
+    region -  a tuple of x and y slices bounding the points to update
+    arrayTimeIndex - the current time step
+    globalTimeStep - a step counter that allows implementation of the scheme
+    """
+    xs,ys = region
+    eulerKernel(state,xs.start,xs.stop,ys.start,ys.stop,arrayTimeIndex,globalTimeStep,euler.dtdx,euler.dtdy,euler.gamma,euler.gM1)
+
+def set_globals(*args,source_mod=None):
+    """Use this function to set cpu global variables"""
+    euler.set_globals(*args,source_mod=source_mod)
@@ -1,7 +1,8 @@
 #Programmer: Anthony Walker
 #This file contains a test step function for debugging the swept rule
 
-import numpy, h5py, mpi4py.MPI as MPI
+import numpy
+from pysweep.utils.generateInput import generateInitialConditions
 try:
     import pycuda.driver as cuda
     from pycuda.compiler import SourceModule
@@ -26,12 +27,23 @@ def step(state,iidx,arrayTimeIndex,globalTimeStep):
             state[arrayTimeIndex+1,:,idx,idy] = state[arrayTimeIndex-timeChange,:,idx,idy]+addition
 
 
+def stepRegion(state,region,arrayTimeIndex,globalTimeStep):
+    """This is the vectorized method that will be called by the swept solver if it exists.
+    state - 4D numpy array(t,v,x,y (v is variables length))
+    region -  a tuple of x and y slices bounding the points to update
+    arrayTimeIndex - the current time step
+    globalTimeStep - a step counter that allows implementation of the scheme
+    """
+    xs,ys = region
+    if scheme: #pseude FE
+        state[arrayTimeIndex+1,:,xs,ys] = state[arrayTimeIndex,:,xs,ys]+1
+    else: #pseudo RK2
+        addition,timeChange = (2,1) if globalTimeStep%2==0 else (1,0) #True - Final Step, False- Intermediate Step
+        state[arrayTimeIndex+1,:,xs,ys] = state[arrayTimeIndex-timeChange,:,xs,ys]+addition
+
 def createInitialConditions(nv,nx,ny,filename="exampleConditions.hdf5"):
     """Use this function to create a set of initial conditions in an hdf5 file."""
-    comm = MPI.COMM_WORLD
-    with h5py.File(filename,"w",driver="mpio",comm=comm) as hf:
-        hf.create_dataset("data",(nv,nx,ny),data=numpy.zeros((nv,nx,ny)))
-    return filename
+    return generateInitialConditions(lambda X,Y:numpy.zeros(X.shape),nv,nx,ny,filename=filename)
 
 def set_globals(*args,source_mod=None):
     """Use this function to set cpu global variables"""
@@ -1,6 +1,6 @@
 
-import numpy, h5py, os, sys
-import mpi4py.MPI as MPI
+import numpy, os, sys
+from pysweep.utils.generateInput import generateInitialConditions
 import pysweep.core.io as io
 try:
     import pycuda.driver as cuda
@@ -17,6 +17,12 @@ def step(state,iidx,arrayTimeIndex,globalTimeStep):
     for idx,idy in iidx:
         state[arrayTimeIndex+1,0,idx,idy] = state[arrayTimeIndex-timechange,0,idx,idy]+coeff*centralDifference(state[arrayTimeIndex,0],idx,idy)
 
+def stepRegion(state,region,arrayTimeIndex,globalTimeStep):
+    """Use this function to solve the HDE with RK2 over a region (tuple of x and y slices)."""
+    coeff,timechange =  (1,1) if globalTimeStep%2==0 else (0.5,0)  #True - Final Step, False- Intermediate Step
+    xs,ys = region
+    state[arrayTimeIndex+1,0,xs,ys] = state[arrayTimeIndex-timechange,0,xs,ys]+coeff*centralDifferenceRegion(state[arrayTimeIndex,0],region)
+
 def set_globals(*args,source_mod=None):
     """Use this function to set cpu global variables"""
     global dt,dx,dy #true for FE
@@ -48,6 +54,15 @@ def centralDifference(state,idx,idy):
     secondDerivativeY = (state[idx,idy+1]-2*state[idx,idy]+state[idx,idy-1])/100
     return secondDerivativeX+secondDerivativeY
 
+def centralDifferenceRegion(state,region):
+    """Use this function to solve the HDE with a 3 point central difference over a region."""
+    xc,yc = region
+    xw,xe = slice(xc.start-1,xc.stop-1,1),slice(xc.start+1,xc.stop+1,1)
+    ys,yn = slice(yc.start-1,yc.stop-1,1),slice(yc.start+1,yc.stop+1,1)
+    secondDerivativeX = (state[xe,yc]-2*state[xc,yc]+state[xw,yc])/100
+    secondDerivativeY = (state[xc,yn]-2*state[xc,yc]+state[xc,ys])/100
+    return secondDerivativeX+secondDerivativeY
+
 def createInitialConditions(npx,npy,t=0,filename="halfConditions.hdf5"):
     """Use this function to create a set of initial conditions in an hdf5 file.
     args:
@@ -55,14 +70,7 @@ def createInitialConditions(npx,npy,t=0,filename="halfConditions.hdf5"):
     npy: number of points in y
     t: time of initial conditions
     """
-    comm = MPI.COMM_WORLD
-    data = numpy.zeros((1,npx,npy))
-    for i,ids in enumerate(numpy.ndindex(data.shape[1:])):
-        idx,idy = ids
-        data[0,idx,idy] = i/100
-    with h5py.File(filename,"w",driver="mpio",comm=comm) as hf:
-        hf.create_dataset("data",data.shape,data=data)
-    return filename
+    return generateInitialConditions(lambda I,J:(I*npy+J)/100,1,npx,npy,xRange=(0,npx),yRange=(0,npy),filename=filename) #points are indices
 
 if __name__ == "__main__":
     pass
\ No newline at end of file
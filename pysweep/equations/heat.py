@@ -1,6 +1,6 @@
-import numpy, h5py, os, sys
+import numpy, os, sys
 import itertools
-import mpi4py.MPI as MPI
+from pysweep.utils.generateInput import generateInitialConditions
 try:
     import pycuda.driver as cuda
 except Exception as e:
@@ -28,6 +28,18 @@ def step(state,iidx,arrayTimeIndex,globalTimeStep):
     else:
         return rungeKuttaTwo(state,iidx,arrayTimeIndex,globalTimeStep)
 
+def stepRegion(state,region,arrayTimeIndex,globalTimeStep):
+    """This is the vectorized method that will be called by the swept solver if it exists.
+    state - 4D numpy array(t,v,x,y (v is variables length))
+    region -  a tuple of x and y slices bounding the points to update
+    arrayTimeIndex - array time index for state
+    globalTimeStep - a step counter that allows implementation of the scheme
+    """
+    if scheme:
+        forwardEulerRegion(state,region,arrayTimeIndex,globalTimeStep)
+    else:
+        rungeKuttaTwoRegion(state,region,arrayTimeIndex,globalTimeStep)
+
 def set_globals(*args,source_mod=None):
     """Use this function to set cpu global variables"""
     global dt,dx,dy,alpha,scheme,courant #true for FE
@@ -54,6 +66,28 @@ def rungeKuttaTwo(state,iidx,arrayTimeIndex,globalTimeStep):
     for idx,idy in iidx:
         state[arrayTimeIndex+1,0,idx,idy] = coeff*centralDifference(state[arrayTimeIndex,0],idx,idy)+state[arrayTimeIndex-timechange,0,idx,idy]
     
+def forwardEulerRegion(state,region,arrayTimeIndex,globalTimeStep):
+    """Use this function to solver the HDE with forward Euler over a region."""
+    xs,ys = region
+    state[arrayTimeIndex+1,0,xs,ys] = centralDifferenceRegion(state[arrayTimeIndex,0],region)+state[arrayTimeIndex,0,xs,ys]
+
+def rungeKuttaTwoRegion(state,region,arrayTimeIndex,globalTimeStep):
+    """Use this function to solve the HDE with RK2 over a region."""
+    coeff,timechange =  (1,1) if globalTimeStep%2==0 else (0.5,0)  #True - Final Step, False- Intermediate Step
+    xs,ys = region
+    state[arrayTimeIndex+1,0,xs,ys] = coeff*centralDifferenceRegion(state[arrayTimeIndex,0],region)+state[arrayTimeIndex-timechange,0,xs,ys]
+
+def centralDifferenceRegion(state,region):
+    """Use this function to solve the HDE with a 3 point central difference over a region.
+    The region must not touch the edges of state.
+    """
+    xc,yc = region
+    xw,xe = slice(xc.start-1,xc.stop-1,1),slice(xc.start+1,xc.stop+1,1)
+    ys,yn = slice(yc.start-1,yc.stop-1,1),slice(yc.start+1,yc.stop+1,1)
+    secondDerivativeX = courant*(state[xe,yc]-2*state[xc,yc]+state[xw,yc])
+    secondDerivativeY = courant*(state[xc,yn]-2*state[xc,yc]+state[xc,ys])
+    return secondDerivativeX+secondDerivativeY
+
 def centralDifference(state,idx,idy):
     """Use this function to solve the HDE with a 3 point central difference."""
     nx,ny = state.shape
@@ -68,25 +102,7 @@ def createInitialConditions(npx,npy,alpha=0.1,t=0,filename="heatConditions.hdf5"
     npy: number of points in y
     t: time of initial conditions
     """
-    comm = MPI.COMM_WORLD
-    rank = comm.Get_rank()
-    if rank == 0:
-        X = numpy.linspace(0,1,npx,endpoint=False)
-        Y = numpy.linspace(0,1,npy,endpoint=False)
-        combos = [(i,j,x,y) for i,x in enumerate(X) for j,y in enumerate(Y)]
-        combos = numpy.array_split(combos,comm.Get_size())
-    else:
-        combos = None
-    combos = comm.scatter(combos)
-    with h5py.File(filename,"w",driver="mpio",comm=comm) as hf:
-        initialConditions = hf.create_dataset("data",(1,npx,npy))
-        for cmb in combos:
-            i,j,x,y = cmb
-            i = int(i)
-            j = int(j)
-            initialConditions[0,i,j] = analyticalEquation(x,y,t=t,alpha=alpha)
-    comm.Barrier()
-    return filename
+    return generateInitialConditions(lambda X,Y:analyticalEquation(X,Y,t=t,alpha=alpha),1,npx,npy,filename=filename,dtype=numpy.float32)
 
 def analyticalEquation(x,y,t,alpha=0.1):
     """Use this to fill hdf5 IC."""
@@ -104,13 +120,8 @@ def analytical(npx,npy,t,alpha=0.1):
     """
     X = numpy.linspace(0,1,npx,endpoint=False)
     Y = numpy.linspace(0,1,npy,endpoint=False)
-    uShape = (1,numpy.shape(X)[0],numpy.shape(Y)[0])
-    u = numpy.zeros(uShape)
-    m = 2 #m and n = 2 makes the function periodic in 0->1
-    n = 2
-    for i,x in enumerate(X):
-        for j,y in enumerate(Y):
-            u[0,i,j] = numpy.sin(m*pi*x)*numpy.sin(n*pi*y)*numpy.exp(-(m*m+n*n)*pi*pi*alpha*t)
+    XG,YG = numpy.meshgrid(X,Y,indexing="ij")
+    u = analyticalEquation(XG,YG,t,alpha=alpha)[numpy.newaxis,:,:] #m and n = 2 makes the function periodic in 0->1
     return u,X,Y
 
 
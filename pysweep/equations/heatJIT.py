@@ -0,0 +1,24 @@
+#Programmer: Anthony Walker
+#This file contains a numba compiled step for the heat equation, the remaining functions are those of heat.py
+#Kernels are compiled when pysweep.equations.jit is imported and cached on disk (see NUMBA_CACHE_DIR)
+from pysweep.equations.jit import heatKernel
+import pysweep.equations.heat as heat
+from pysweep.equations.heat import createInitialConditions, analyticalEquation, analytical
+
+def step(state,iidx,arrayTimeIndex,globalTimeStep):
+    """This is the point method, it is not compiled and only used if stepRegion is not."""
+    heat.step(state,iidx,arrayTimeIndex,globalTimeStep)
+
+def stepRegion(state,region,arrayTimeIndex,globalTimeStep):
+    """This is the compiled method that will be called by the swept solver.
+    state - 4D float64 numpy array(t,v,x,y (v is variables length))
+    region -  a tuple of x and y slices bounding the points to update
+    arrayTimeIndex - array time index for state
+    globalTimeStep - a step counter that allows implementation of the scheme
+    """
+    xs,ys = region
+    heatKernel(state,xs.start,xs.stop,ys.start,ys.stop,arrayTimeIndex,globalTimeStep,heat.courant,bool(heat.scheme))
+
+def set_globals(*args,source_mod=None):
+    """Use this function to set cpu global variables"""
+    heat.set_globals(*args,source_mod=source_mod)
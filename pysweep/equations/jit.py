@@ -0,0 +1,104 @@
+#Programmer: Anthony Walker
+#This file contains the numba compiled kernels used by the JIT equation modules (heatJIT.py, eulerJIT.py)
+#Kernels are kept in this importable module so the on disk cache (see NUMBA_CACHE_DIR) is valid however the equation module is loaded
+#Kernels are compiled for both dtypes the solver supports, float64 and float32
+import numpy, numba
+
+@numba.njit(["void({}[:,:,:,:],int64,int64,int64,int64,int64,int64,float64,boolean)".format(dtype) for dtype in ("float64","float32")],cache=True,nogil=True,error_model="numpy")
+def heatKernel(state,xl,xu,yl,yu,arrayTimeIndex,globalTimeStep,courant,scheme):
+    """Use this function to solve the HDE with forward Euler or RK2 and a 3 point central difference over a region."""
+    if scheme or globalTimeStep%2!=0:
+        coeff,timechange = (1.0,0) if scheme else (0.5,0) #Forward Euler or intermediate step
+    else:
+        coeff,timechange = 1.0,1 #Final step
+    t = arrayTimeIndex
+    for i in range(xl,xu):
+        for j in range(yl,yu):
+            secondDerivativeX = courant*(state[t,0,i+1,j]-2*state[t,0,i,j]+state[t,0,i-1,j])
+            secondDerivativeY = courant*(state[t,0,i,j+1]-2*state[t,0,i,j]+state[t,0,i,j-1])
+            state[t+1,0,i,j] = coeff*(secondDerivativeX+secondDerivativeY)+state[t-timechange,0,i,j]
+
+@numba.njit(cache=True,nogil=True,error_model="numpy")
+def getPressure(rho,rhou,rhov,rhoe,gM1):
+    """Use this function to solve for pressure of the 2D Eulers equations at a point."""
+    return gM1*(rhoe-(rhou*rhou+rhov*rhov)/(2*rho))
+
+@numba.njit(cache=True,nogil=True,error_model="numpy")
+def fluxLimiter(q,i1,j1,i2,j2,num,den,limited):
+    """This function computers the minmod flux limiter based on pressure ratio and stores it in limited."""
+    Pr = num/den
+    if not (numpy.isfinite(Pr) and Pr <= 1e6 and Pr >= 0):
+        Pr = 0.0
+    for v in range(4):
+        limited[v] = q[v,i1,j1]+min(Pr,1.0)/2*(q[v,i2,j2]-q[v,i1,j1])
+
+@numba.njit(cache=True,nogil=True,error_model="numpy")
+def evaluateFlux(left,right,dim,gM1,flux):
+    """Use this function to get the flux in x (dim=1) or y (dim=2) and store it in flux."""
+    PL = getPressure(left[0],left[1],left[2],left[3],gM1)
+    PR = getPressure(right[0],right[1],right[2],right[3],gM1)
+    other = 3-dim
+    flux[0] = left[dim]+right[dim]
+    flux[dim] = left[dim]*left[dim]/left[0]+PL+right[dim]*right[dim]/right[0]+PR
+    flux[other] = left[1]*left[2]/left[0]+right[1]*right[2]/right[0]
+    flux[3] = (left[3]+PL)*left[dim]/left[0]+(right[3]+PR)*right[dim]/right[0]
+
+@numba.njit(cache=True,nogil=True,error_model="numpy")
+def evaluateSpectral(left,right,dim,gamma,gM1):
+    """Use this method to compute the spectral radius of the Roe average in x (dim=1) or y (dim=2)."""
+    rootrhoL = numpy.sqrt(left[0])
+    rootrhoR = numpy.sqrt(right[0])
+    denom = 1/(rootrhoL+rootrhoR)
+    spec0 = rootrhoL*rootrhoR
+    spec1 = (rootrhoL*(left[1]/left[0])+rootrhoR*(right[1]/right[0]))*denom
+    spec2 = (rootrhoL*(left[2]/left[0])+rootrhoR*(right[2]/right[0]))*denom
+    spec3 = (rootrhoL*(left[3]/left[0])+rootrhoR*(right[3]/right[0]))*denom
+    P = getPressure(spec0,spec0*spec1,spec0*spec2,spec0*spec3,gM1)
+    specDim = spec1 if dim == 1 else spec2
+    spectralRadius = numpy.sqrt(gamma*P/spec0)+abs(specDim)
+    return 0.0 if numpy.isnan(spectralRadius) else spectralRadius
+
+@numba.njit(cache=True,nogil=True,error_model="numpy")
+def getDirectionalFlux(q,P,i,j,di,dj,li,lj,dim,gamma,gM1,left,right,temp,flux):
+    """Use this function to get the flux of a point in the direction (di,dj), P is indexed locally by (li,lj)."""
+    nx,ny = q.shape[1],q.shape[2]
+    wi,wj = (i-di)%nx,(j-dj)%ny
+    ei,ej = (i+di)%nx,(j+dj)%ny
+    Pww,Pw,Pc,Pe,Pee = P[li-2*di,lj-2*dj],P[li-di,lj-dj],P[li,lj],P[li+di,lj+dj],P[li+2*di,lj+2*dj]
+    #west or south part of stencil
+    fluxLimiter(q,wi,wj,i,j,Pc-Pw,Pw-Pww,left)
+    fluxLimiter(q,i,j,wi,wj,Pc-Pw,Pe-Pc,right)
+    evaluateFlux(left,right,dim,gM1,temp)
+    spectralRadius = evaluateSpectral(left,right,dim,gamma,gM1)
+    for v in range(4):
+        flux[v] = temp[v]+spectralRadius*(left[v]-right[v])
+    #east or north part of stencil
+    fluxLimiter(q,i,j,ei,ej,Pe-Pc,Pc-Pw,left)
+    fluxLimiter(q,ei,ej,i,j,Pe-Pc,Pee-Pe,right)
+    evaluateFlux(left,right,dim,gM1,temp)
+    spectralRadius = evaluateSpectral(left,right,dim,gamma,gM1)
+    for v in range(4):
+        flux[v] = (flux[v]-temp[v]-spectralRadius*(left[v]-right[v]))*0.5
+
+@numba.njit(["void({}[:,:,:,:],int64,int64,int64,int64,int64,int64,float64,float64,float64,float64)".format(dtype) for dtype in ("float64","float32")],cache=True,nogil=True,error_model="numpy")
+def eulerKernel(state,xl,xu,yl,yu,arrayTimeIndex,globalTimeStep,dtdx,dtdy,gamma,gM1):
+    """Use this function to take a RK2 step of the euler equations over a region."""
+    ops = 2
+    q = state[arrayTimeIndex]
+    nx,ny = q.shape[1],q.shape[2]
+    #Finding pressure once for the padded region
+    P = numpy.empty((xu-xl+2*ops,yu-yl+2*ops))
+    for li in range(P.shape[0]):
+        for lj in range(P.shape[1]):
+            i,j = (xl-ops+li)%nx,(yl-ops+lj)%ny
+            P[li,lj] = getPressure(q[0,i,j],q[1,i,j],q[2,i,j],q[3,i,j],gM1)
+    coeff,timechange = (1.0,1) if globalTimeStep%2==0 else (0.5,0) #True - Final Step, False- Intermediate Step
+    left,right,temp = numpy.empty(4),numpy.empty(4),numpy.empty(4)
+    fluxx,fluxy = numpy.empty(4),numpy.empty(4)
+    for i in range(xl,xu):
+        for j in range(yl,yu):
+            li,lj = i-xl+ops,j-yl+ops
+            getDirectionalFlux(q,P,i,j,1,0,li,lj,1,gamma,gM1,left,right,temp,fluxx)
+            getDirectionalFlux(q,P,i,j,0,1,li,lj,2,gamma,gM1,left,right,temp,fluxy)
+            for v in range(4):
+                state[arrayTimeIndex+1,v,i,j] = state[arrayTimeIndex-timechange,v,i,j]+coeff*(fluxx[v]*dtdx+fluxy[v]*dtdy)
@@ -1,5 +1,5 @@
 
-import pysweep,numpy,sys,os,h5py,yaml,time,warnings
+import pysweep,numpy,sys,os,h5py,yaml,time,warnings,pytest
 import matplotlib.pyplot as plt
 path = os.path.dirname(os.path.abspath(__file__))
 eqnPath = os.path.join(os.path.dirname(path),"equations")
@@ -163,6 +163,446 @@ def testEulerVortex(solver,arraysize,printError=True):
         
 #-------------------------------------Completed Tests------------------#
 
+def testStepRegion():
+    """Use this function to test stepRegion against step on the swept and standard regions of the shipped equations."""
+    bs = 12
+    eulerState = numpy.zeros((3,4,bs+4,bs+4))
+    eulerState[:2] = pysweep.equations.euler.getAnalyticalArray(bs+4,bs+4,0)
+    cases = [(pysweep.equations.heat,[0,1,0.01,0.1,0.1,1,True],1,numpy.random.rand(3,1,bs+4,bs+4)),
+            (pysweep.equations.heat,[0,1,0.01,0.1,0.1,1,False],1,numpy.random.rand(3,1,bs+4,bs+4)),
+            (pysweep.equations.half,[0,1,0.01,0.1,0.1],1,numpy.random.rand(3,1,bs+4,bs+4)),
+            (pysweep.equations.checker,[0,1,0.01,0.1,0.1,True],1,numpy.random.rand(3,2,bs+4,bs+4)),
+            (pysweep.equations.example,[0,1,0.01,0.1,0.1,False],2,numpy.random.rand(3,2,bs+4,bs+4)),
+            (pysweep.equations.euler,[0,1,0.01,0.1,0.1,1.4],2,eulerState)]
+    for module,globs,ops,state in cases:
+        module.set_globals(*globs)
+        upSets = pysweep.core.block.createUpPyramidSets((bs,bs,1),ops)
+        downSets = pysweep.core.block.createDownPyramidSets((bs,bs,1),ops)
+        ySets,xSets = pysweep.core.block.createBridgeSets((bs,bs,1),ops,bs//(2*ops)-1)
+        standardSet = ((slice(ops,bs+ops,1),slice(ops,bs+ops,1)),)
+        for region in upSets+downSets+ySets+xSets+standardSet:
+            for globalTimeStep in (1,2):
+                pointState = numpy.copy(state)
+                regionState = numpy.copy(state)
+                module.step(pointState,pysweep.core.geometry.regionToIndices(region),1,globalTimeStep)
+                module.stepRegion(regionState,region,1,globalTimeStep)
+                assert numpy.allclose(pointState,regionState,rtol=1e-14,atol=1e-14)
+
+def testSweptSetsCache():
+    """Use this function to test that swept sets and adapter index arrays are memoized and read only."""
+    sets = pysweep.core.block.createSweptSets((12,12,1),1,5)
+    assert all(a is b for a,b in zip(sets,pysweep.core.block.createSweptSets((12,12,1),1,5)))
+    region = sets[0][0]
+    indices = pysweep.core.geometry.regionToIndices(region)
+    assert indices is pysweep.core.geometry.regionToIndices(region)
+    xs,ys = region
+    assert indices.dtype == numpy.int32 and indices.shape == ((xs.stop-xs.start)*(ys.stop-ys.start),2)
+    assert not indices.flags.writeable
+
+def testInPlaceBlocks():
+    """Use this function to test that solving slice blocks in place in the shared array matches solving copies of them."""
+    heat = pysweep.equations.heat
+    heat.set_globals(0,1,0.001,0.1,0.1,1,False)
+    bs,ops,its,npx = 12,1,2,24
+    MPS = bs//(2*ops)-1
+    sharedShape = (2*MPS+its,1,npx,npx)
+    timeSlice,variableSlice = slice(0,sharedShape[0],1),slice(0,1,1)
+    blocks = [(timeSlice,variableSlice,slice(i,i+bs,1),slice(j,j+bs,1)) for i in range(0,npx,bs) for j in range(0,npx,bs)]
+    edgeblocks = pysweep.core.block.makeEdgeBlocksSwept(blocks,sharedShape,(bs,bs,1))
+    up_sets,down_sets,oct_sets,y_sets,x_sets = pysweep.core.block.createSweptSets((bs,bs,1),ops,MPS)
+    initial = numpy.random.RandomState(2).rand(*sharedShape)
+    for timeBase in (0,3): #a shifted time base solves steps that straddle the ring in a gathered window
+        results = list()
+        for inPlace in (True,False):
+            sharedArray = numpy.copy(initial)
+            for sets,phaseBlocks in ((up_sets,edgeblocks),(oct_sets,blocks)):
+                phase = pysweep.core.geometry.Geometry()
+                phase.initializeCPU(heat,sets,its-1,sharedArray[blocks[0]].shape)
+                phase.setInPlace(inPlace)
+                phase.setTimeBase(timeBase)
+                phase.callCPU(sharedArray,phaseBlocks,1)
+            results.append(sharedArray)
+        assert numpy.array_equal(*results)
+
+def eulerPointFlux(state,idx,idy,evaluateFlux,stencil,xy):
+    """Use this function to get the flux of a single point as the euler module originally did."""
+    euler = pysweep.equations.euler
+    vs = slice(0,4,1)
+    P = lambda pt: euler.getPressure(state[(vs,)+pt])
+    ww,w,c,e,ee = stencil
+    flux = numpy.zeros(4)
+    left = euler.fluxLimiter(state,(vs,)+w,(vs,)+c,P(c)-P(w),P(w)-P(ww))
+    right = euler.fluxLimiter(state,(vs,)+c,(vs,)+w,P(c)-P(w),P(e)-P(c))
+    flux += evaluateFlux(left,right)+euler.evaluateSpectral(left,right,xy)
+    left = euler.fluxLimiter(state,(vs,)+c,(vs,)+e,P(e)-P(c),P(c)-P(w))
+    right = euler.fluxLimiter(state,(vs,)+e,(vs,)+c,P(e)-P(c),P(ee)-P(e))
+    flux -= evaluateFlux(left,right)+euler.evaluateSpectral(left,right,xy)
+    return flux*0.5
+
+def testEulerFluxPipeline():
+    """Use this function to test the whole array euler step against a point by point evaluation, including periodic edges."""
+    euler = pysweep.equations.euler
+    npts = 16
+    euler.set_globals(0,1,0.1*10/npts,10/npts,10/npts,1.4)
+    state = numpy.zeros((3,4,npts,npts))
+    state[:2] = euler.getAnalyticalArray(npts,npts,0)
+    for globalTimeStep in (1,2):
+        expected = numpy.copy(state)
+        timeChange,coeff = (1,1) if globalTimeStep%2==0 else (0,0.5)
+        for idx,idy in numpy.ndindex(npts,npts):
+            xStencil = tuple(((idx+i)%npts,idy) for i in range(-2,3,1))
+            yStencil = tuple((idx,(idy+i)%npts) for i in range(-2,3,1))
+            fluxx = eulerPointFlux(state[1],idx,idy,euler.evaluateFluxInX,xStencil,True)
+            fluxy = eulerPointFlux(state[1],idx,idy,euler.evaluateFluxInY,yStencil,False)
+            expected[2,:,idx,idy] = state[1-timeChange,:,idx,idy]+coeff*(fluxx*euler.dtdx+fluxy*euler.dtdy)
+        actual = numpy.copy(state)
+        euler.step(actual,list(numpy.ndindex(npts,npts)),1,globalTimeStep)
+        assert numpy.allclose(actual,expected,rtol=1e-13,atol=1e-13)
+        actual = numpy.copy(state)
+        euler.stepRegion(actual,(slice(2,npts-2,1),slice(3,npts-4,1)),1,globalTimeStep)
+        assert numpy.allclose(actual[2,:,2:npts-2,3:npts-4],expected[2,:,2:npts-2,3:npts-4],rtol=1e-13,atol=1e-13)
+
+def testJITStepRegion():
+    """Use this function to test the numba compiled stepRegion functions against the numpy ones, including periodic edges and views."""
+    pytest.importorskip("numba") #numba is an optional dependency
+    import pysweep.equations.heatJIT as heatJIT
+    import pysweep.equations.eulerJIT as eulerJIT
+    npts = 16
+    eulerState = numpy.zeros((3,4,npts,npts))
+    eulerState[:2] = pysweep.equations.euler.getAnalyticalArray(npts,npts,0)
+    cases = [(pysweep.equations.heat,heatJIT,[0,1,0.01,0.1,0.1,1,True],1,numpy.random.rand(3,1,npts,npts)),
+            (pysweep.equations.heat,heatJIT,[0,1,0.01,0.1,0.1,1,False],1,numpy.random.rand(3,1,npts,npts)),
+            (pysweep.equations.euler,eulerJIT,[0,1,0.01,0.1,0.1,1.4],2,eulerState)]
+    for module,jitModule,globs,ops,state in cases:
+        jitModule.set_globals(*globs)
+        regions = [(slice(ops,npts-ops,1),slice(ops+1,npts-ops-2,1))]
+        if module is pysweep.equations.euler:
+            regions.append((slice(0,npts,1),slice(0,npts,1)))
+        for region in regions:
+            for globalTimeStep in (1,2):
+                expected = numpy.copy(state)
+                actual = numpy.copy(state)
+                module.stepRegion(expected,region,1,globalTimeStep)
+                jitModule.stepRegion(actual,region,1,globalTimeStep)
+                assert numpy.allclose(actual,expected,rtol=1e-13,atol=1e-13)
+        #views of a larger shared array are solved in place
+        shared = numpy.zeros((4,)+state.shape[1:])
+        shared[:3] = state
+        expected = numpy.copy(state)
+        module.stepRegion(expected,regions[0],1,2)
+        jitModule.stepRegion(shared[:3],regions[0],1,2)
+        assert numpy.allclose(shared[:3],expected,rtol=1e-13,atol=1e-13)
+        #float32 runs use the same kernels
+        single = state.astype(numpy.float32)
+        jitModule.stepRegion(single,regions[0],1,2)
+        assert single.dtype == numpy.float32 and numpy.allclose(single,expected,rtol=1e-3,atol=1e-3)
+
+def runSweptCycles(module,ops,its,blocksize,inPlace,ring,cycles=6,npx=48):
+    """Use this function to run the first prism and several up prism and write cycles of one node, it returns the levels written every cycle and the number of gathered steps.
+    The time axis is a ring if ring is True, otherwise levels are copied down after every write as they were before the ring.
+    """
+    MPS = blocksize//(2*ops)-1
+    solver = pysweep.Solver(sendWarning=False)
+    solver.sharedShape = (2*MPS+its,1,npx,npx)
+    solver.maxPyramidSize,solver.intermediate = MPS,its
+    solver.subtraction = 1 if MPS%2!=0 and its%2==0 else 0
+    solver.globalTimeStep = 1
+    sharedArray = numpy.random.RandomState(1).rand(*solver.sharedShape)
+    timeSlice,variableSlice = slice(0,solver.sharedShape[0],1),slice(0,solver.sharedShape[1],1)
+    blocks = [(timeSlice,variableSlice,slice(i,i+blocksize,1),slice(j,j+blocksize,1)) for i in range(0,npx,blocksize) for j in range(0,npx,blocksize)]
+    edgeblocks = pysweep.core.block.makeEdgeBlocksSwept(blocks,solver.sharedShape,(blocksize,blocksize,1))
+    shiftedBlocks = [pysweep.core.block.shiftBlockX(block,blocksize//2,npx) for block in blocks]
+    shiftedEdgeblocks = [pysweep.core.block.shiftBlockX(block,blocksize//2,npx) for block in edgeblocks]
+    up_sets,down_sets,oct_sets,y_sets,x_sets = pysweep.core.block.createSweptSets((blocksize,blocksize,1),ops,MPS)
+    gathered = [0]
+    for name,sets in zip(("Up","Xb","Yb","Oct"),(up_sets,x_sets,y_sets,oct_sets)):
+        phase = pysweep.core.geometry.Geometry()
+        phase.initializeCPU(module,sets,its-1,sharedArray[blocks[0]].shape)
+        phase.setInPlace(inPlace)
+        step = phase.step
+        def countedStep(state,region,t,globalTimeStep,step=step,phase=phase):
+            gathered[0] += state.shape[0] == phase.depth+2 and state.shape[0] != solver.sharedShape[0]
+            step(state,region,t,globalTimeStep)
+        phase.step = countedStep
+        setattr(solver,name,phase)
+    pysweep.core.functions.setTimeBase(solver,0)
+    #First prism
+    solver.Up.callCPU(sharedArray,edgeblocks,solver.globalTimeStep)
+    solver.Yb.callCPU(sharedArray,blocks,solver.globalTimeStep)
+    solver.Yb.startAdd(MPS)
+    blocks,shiftedBlocks,edgeblocks,shiftedEdgeblocks = shiftedBlocks,blocks,shiftedEdgeblocks,edgeblocks
+    written = list()
+    for i in range(cycles):
+        solver.Xb.callCPU(sharedArray,blocks,solver.globalTimeStep)
+        solver.Oct.callCPU(sharedArray,edgeblocks,solver.globalTimeStep)
+        solver.globalTimeStep+=MPS
+        solver.Yb.callCPU(sharedArray,blocks,solver.globalTimeStep)
+        written.append(numpy.array([sharedArray[level] for level in pysweep.core.io.getSweptWriteLevels(solver)]))
+        if ring:
+            pysweep.core.functions.setTimeBase(solver,solver.timeBase+MPS)
+        else:
+            nte = solver.sharedShape[0]-MPS
+            sharedArray[:nte] = sharedArray[MPS:]
+        blocks,shiftedBlocks,edgeblocks,shiftedEdgeblocks = shiftedBlocks,blocks,shiftedEdgeblocks,edgeblocks
+    return written,gathered[0]
+
+def testTimeRing():
+    """Use this function to test that swept cycles on the time ring write the same levels as copying levels down after every write."""
+    cases = [(pysweep.equations.heat,[0,1,0.001,0.1,0.1,1,True],1,1,12),
+            (pysweep.equations.heat,[0,1,0.001,0.1,0.1,1,False],1,2,12),
+            (pysweep.equations.example,[0,1,0.1,0.1,0.1,False],2,2,16),
+            (pysweep.equations.example,[0,1,0.1,0.1,0.1,True],1,1,24)]
+    for module,globs,ops,its,blocksize in cases:
+        module.set_globals(*globs)
+        for inPlace in (True,False):
+            expected,copied = runSweptCycles(module,ops,its,blocksize,inPlace,False)
+            actual,gathered = runSweptCycles(module,ops,its,blocksize,inPlace,True)
+            assert gathered > 0 and copied == 0 #steps that straddle the end of the ring are solved in a gathered window
+            assert all(numpy.array_equal(a,e) for a,e in zip(actual,expected))
+
+def testThreadedBlocks():
+    """Use this function to test that solving cpu blocks with a thread pool matches solving them serially."""
+    from concurrent.futures import ThreadPoolExecutor
+    heat = pysweep.equations.heat
+    heat.set_globals(0,1,0.01,0.1,0.1,1,False)
+    bs,ops,its,npx = 8,1,2,32
+    MPSS = bs//(2*ops)-1
+    sharedShape = (2*MPSS+its,1,npx,npx)
+    timeSlice,variableSlice = slice(0,sharedShape[0],1),slice(0,1,1)
+    blocks = [(timeSlice,variableSlice,slice(i,i+bs,1),slice(j,j+bs,1)) for i in range(0,npx,bs) for j in range(0,npx,bs)]
+    edgeblocks = pysweep.core.block.makeEdgeBlocksSwept(blocks,sharedShape,(bs,bs,1))
+    up_sets,down_sets,oct_sets,y_sets,x_sets = pysweep.core.block.createSweptSets((bs,bs,1),ops,MPSS)
+    initial = numpy.zeros(sharedShape)
+    initial[:its] = numpy.random.rand(its,1,npx,npx)
+    results = list()
+    for pool in (None,ThreadPoolExecutor(max_workers=4)):
+        sharedArray = numpy.copy(initial)
+        phases = [pysweep.core.geometry.Geometry() for i in range(3)]
+        for phase,sets in zip(phases,(up_sets,oct_sets,y_sets)):
+            phase.initializeCPU(heat,sets,its-1,sharedArray[blocks[0]].shape)
+            phase.setPool(pool)
+        Up,Oct,Yb = phases
+        Up.callCPU(sharedArray,blocks,1)
+        Oct.callCPU(sharedArray,edgeblocks,1)
+        Yb.callCPU(sharedArray,blocks,1)
+        results.append(sharedArray)
+    pool.shutdown()
+    assert numpy.array_equal(*results)
+
+def testShiftBlockX():
+    """Use this function to test that shifted blocks address the x ring as the previously shifted shared array did."""
+    nx,ny,bs = 24,16,8
+    sharedArray = numpy.random.rand(3,2,nx,ny)
+    rolled = numpy.roll(sharedArray,bs//2,axis=2) #Data shifted forward by splitx
+    ts,vs = slice(0,3,1),slice(0,2,1)
+    yArray = numpy.concatenate((numpy.arange(ny-bs,ny),numpy.arange(0,ny),numpy.arange(0,bs))) #like the gpu read block
+    for i in range(0,nx,bs):
+        for yIndex in (slice(0,bs,1),slice(bs,2*bs,1),yArray):
+            block = (ts,vs,slice(i,i+bs,1),yIndex)
+            shifted = pysweep.core.block.shiftBlockX(block,bs//2,nx)
+            assert numpy.array_equal(sharedArray[shifted],rolled[block])
+            values = numpy.random.rand(*rolled[block].shape)
+            sharedArray[shifted] = values
+            rolled[block] = values
+            assert numpy.array_equal(numpy.roll(sharedArray,bs//2,axis=2),rolled)
+
+def testAsyncWriter():
+    """Use this function to test that the background writer writes every staged level and raises its errors."""
+    dataset = numpy.zeros((20,2,4,4))
+    expected = numpy.random.rand(20,2,4,4)
+    levels = numpy.copy(expected)
+    writer = pysweep.core.io.AsyncWriter(dataset,(2,4,4),numpy.float64,2)
+    for i in range(20):
+        writer.write((i,slice(0,2,1),slice(0,4,1),slice(0,4,1)),levels[i])
+        levels[i] = 0 #staged levels are copies so the source can be reused
+    writer.close()
+    assert numpy.array_equal(dataset,expected)
+    writer = pysweep.core.io.AsyncWriter(dataset,(2,4,4),numpy.float64,1)
+    writer.write((20,),numpy.ones((2,4,4))) #out of bounds
+    try:
+        writer.close()
+        raised = False
+    except Exception as e:
+        raised = True
+    assert raised
+
+def testNodeGrid():
+    """Use this function to test the choice of the node grid and the neighbors of a node on it."""
+    solver = pysweep.Solver(sendWarning=False)
+    solver.arrayShape = (1,48,48)
+    solver.blocksize = (8,8,1)
+    solver.share = 0
+    assert pysweep.core.process.getNodeGrid(solver,4) == (4,1) #Equal halos keep nodes in x
+    assert pysweep.core.process.getNodeGrid(solver,9) == (3,3)
+    assert pysweep.core.process.getNodeGrid(solver,12) == (4,3)
+    solver.share = 0.5
+    assert pysweep.core.process.getNodeGrid(solver,9) == (9,1)
+    solver.nodeGrid = (2,3)
+    assert pysweep.core.process.getNeighborRanks(solver,1) == ((3,3),(2,1))
+    assert pysweep.core.process.getNeighborRanks(solver,5) == ((1,1),(3,5))
+
+def testWeightedBoundaries():
+    """Use this function to test that rows are split in proportion to node speeds with at least one row per node."""
+    bounds = [pysweep.core.process.getWeightedBoundaries(12,[1,1,2],i) for i in range(1,4)]
+    assert bounds == [(0,3),(3,6),(6,12)]
+    bounds = [pysweep.core.process.getWeightedBoundaries(6,[100,1,1],i) for i in range(1,4)]
+    assert bounds == [(0,4),(4,5),(5,6)] #slow nodes keep a row
+
+def testBlockOrder():
+    """Use this function to test that curve orders list every block once and the hilbert curve steps between neighboring blocks."""
+    solver = pysweep.Solver(sendWarning=False)
+    solver.blockOrder = "column"
+    assert pysweep.core.process.getBlockOrder(solver,2,3) == [(0,0),(1,0),(0,1),(1,1),(0,2),(1,2)]
+    solver.blockOrder = "morton"
+    assert pysweep.core.process.getBlockOrder(solver,4,4)[:8] == [(0,0),(0,1),(1,0),(1,1),(0,2),(0,3),(1,2),(1,3)]
+    solver.blockOrder = "hilbert"
+    for rows,columns in ((8,8),(6,10)):
+        order = pysweep.core.process.getBlockOrder(solver,rows,columns)
+        assert sorted(order) == [(i,j) for i in range(rows) for j in range(columns)]
+    order = pysweep.core.process.getBlockOrder(solver,8,8)
+    assert all(abs(i0-i1)+abs(j0-j1) == 1 for (i0,j0),(i1,j1) in zip(order[:-1],order[1:]))
+
+def testBlockCounter():
+    """Use this function to test that a rank claims every block of consecutive phases from the block counter."""
+    MPI = pysweep.core.process.MPI
+    win = MPI.Win.Allocate_shared(8,8,comm=MPI.COMM_SELF)
+    counterBuffer, itemsize = win.Shared_query(0)
+    numpy.ndarray(buffer=counterBuffer,dtype=numpy.int64,shape=(1,))[0] = 0
+    win.Lock_all()
+    counter = pysweep.core.geometry.BlockCounter(win,2,1)
+    assert list(counter.claim(list(range(5)))) == [[0,1],[2,3],[4]]
+    assert list(counter.claim([])) == []
+    assert list(counter.claim(list(range(3)))) == [[0,1],[2]]
+    win.Unlock_all()
+    win.Free()
+
+def testAutotuneCandidates():
+    """Use this function to test the blocksizes the autotuner tries."""
+    solver = pysweep.Solver(sendWarning=False)
+    solver.arrayShape = (4,48,48)
+    solver.operating = 2
+    solver.share = 0
+    assert pysweep.core.process.getAutotuneCandidates(solver) == [8,12,16,24,48]
+    solver.share = 0.5
+    assert pysweep.core.process.getAutotuneCandidates(solver) == [8,12,16,24] #gpu blocks are limited
+
+def testChunkShape():
+    """Use this function to test the chunk shapes of the output dataset layouts."""
+    solver = pysweep.Solver(sendWarning=False)
+    solver.arrayShape = solver.outputShape = (11,4,48,24)
+    solver.blocksize = (8,8,1)
+    assert pysweep.core.io.getChunkShape(solver) is None
+    solver.compression = "gzip"
+    assert pysweep.core.io.getChunkShape(solver) == (1,4,8,8) #compression implies block chunks
+    solver.chunks = "slab"
+    assert pysweep.core.io.getChunkShape(solver) == (1,4,8,24)
+    solver.chunks = [2,4,16,24]
+    assert pysweep.core.io.getChunkShape(solver) == (2,4,16,24)
+    solver.writeStride = 3
+    solver.writeVariables = [0,3]
+    solver.writeRegion = [[4,40],[8,20]]
+    solver.outputShape = pysweep.core.io.getOutputShape(solver)
+    solver.chunks = "block"
+    assert pysweep.core.io.getChunkShape(solver) == (1,2,8,8) #chunks are of the kept levels, variables, and region
+    solver.chunks = "slab"
+    assert pysweep.core.io.getChunkShape(solver) == (1,2,8,12)
+    solver.writeRegion = [[4,40],[18,22]]
+    solver.outputShape = pysweep.core.io.getOutputShape(solver)
+    solver.chunks = "block"
+    assert pysweep.core.io.getChunkShape(solver) == (1,2,8,4) #never larger than the region
+
+def testNodeRankRows():
+    """Use this function to test that the rows of a node are split among its ranks in whole blocks when the blocks do not divide evenly."""
+    from types import SimpleNamespace
+    solver = pysweep.Solver(sendWarning=False)
+    solver.globalBlock = (slice(0,4,1),slice(16,56,1),slice(0,24,1))
+    solver.blocksize = (8,8,1)
+    def getRows(ranks):
+        rows = list()
+        for rank in range(ranks):
+            solver.nodeComm = SimpleNamespace(Get_size=lambda:ranks,Get_rank=lambda:rank)
+            rows.append(pysweep.core.io.getNodeRankRows(solver))
+        return rows
+    assert getRows(1) == [(0,40)]
+    assert getRows(3) == [(0,16),(16,32),(32,40)] #five blocks over three ranks
+    assert getRows(7) == [(0,8),(8,16),(16,24),(24,32),(32,40),(0,0),(0,0)] #ranks without a block write nothing
+
+def testOutputShape():
+    """Use this function to test that the output dataset is sized by the stride, variables, and region that are written."""
+    solver = pysweep.Solver(sendWarning=False)
+    solver.arrayShape = (11,4,48,24)
+    assert pysweep.core.io.getOutputShape(solver) == (11,4,48,24)
+    solver.writeStride = 3
+    solver.writeVariables = [0,3]
+    solver.writeRegion = [[8,40],[4,12]]
+    assert pysweep.core.io.getOutputShape(solver) == (4,2,32,8) #levels 0, 3, 6, and 9 are kept
+
+def testGenerateInitialConditions():
+    """Use this function to test that initial conditions written in blocks of rows match the function evaluated over the whole domain."""
+    filename = pysweep.utils.generateInput.generateInitialConditions(lambda X,Y:(X*Y,X+Y),2,10,6,xRange=(0,10),yRange=(0,6),filename="generated.hdf5",blockRows=3)
+    X,Y = numpy.meshgrid(numpy.arange(10),numpy.arange(6),indexing="ij")
+    with h5py.File(filename,"r") as hf:
+        assert numpy.allclose(hf["data"][:],[X*Y,X+Y])
+    os.remove(filename)
+
+def testRunLog():
+    """Use this function to test that runs appended to the run log are queried by configuration."""
+    logFile = "testLog.db"
+    entry = {"date":"01/01/2020-00:00:00","equation":"heat","swept":1,"blocksize":8,"share":0.5,"nx":16,"ny":16,"processes":2,"runtime":1.0,"time_per_step":0.1,"cpu":"heat.py","array_shape":"[11, 1, 16, 16]"}
+    try:
+        pysweep.core.io.appendLogEntries(logFile,[entry,dict(entry,runtime=2.0),dict(entry,swept=0),dict(entry,equation="euler")])
+        assert len(pysweep.core.io.queryLogFile(logFile,equation="heat")) == 3
+        rows = pysweep.core.io.queryLogFile(logFile,equation="heat",swept=True,blocksize=8,share=0.5,unique=True)
+        assert len(rows) == 1 and rows[0]["runtime"] == 1.0 and rows[0]["array_shape"] == [11,1,16,16] #First run of the configuration is kept
+    finally:
+        if os.path.isfile(logFile):
+            os.remove(logFile)
+
+def testCheckpointRestart():
+    """Use this function to test that swept runs restarted from checkpoints at even and odd positions match an uninterrupted run."""
+    arraysize,timesteps = 24,24 #7 swept cycles with a blocksize of 8
+    filename = pysweep.equations.heat.createInitialConditions(arraysize,arraysize,alpha=1,filename="checkpointConditions.hdf5")
+    def runHeat(interval,restart):
+        solver = pysweep.Solver(sendWarning=False)
+        solver.dtypeStr = 'float64'
+        solver.dtype = numpy.dtype(solver.dtypeStr)
+        solver.verbose = False
+        solver.share = 0
+        solver.simulation = True
+        solver.blocksize = (8,8,1)
+        adjustHeatGlobals(solver,arraysize,True,timesteps=timesteps)
+        setupSolver(solver,filename,"heat.py","heat.cu",1,1)
+        solver.output = "testingCheckpoint.hdf5"
+        solver.checkpointInterval = interval
+        solver.restart = restart
+        solver()
+        with h5py.File(solver.output,"r",driver="mpio",comm=solver.comm) as hf:
+            return solver,hf["data"][:]
+    solver,reference = runHeat(0,False)
+    for interval,parity in ((6,0),(5,1)): #last checkpoints are at positions 6 and 5
+        solver,data = runHeat(interval,False)
+        with h5py.File(solver.checkpointFile,"r",driver="mpio",comm=solver.comm) as hf:
+            position,cwt = int(hf["state"].attrs["position"]),int(hf["state"].attrs["cwt"])
+        assert position%2 == parity
+        with h5py.File(solver.output,"r+",driver="mpio",comm=solver.comm) as hf: #Interrupting the run after the checkpoint
+            if solver.rank == 0:
+                hf["data"][cwt:] = 0
+        solver,data = runHeat(interval,True)
+        assert numpy.array_equal(data,reference)
+    solver.comm.Barrier()
+    if solver.rank == 0:
+        for name in (filename,solver.output,solver.checkpointFile):
+            os.remove(name)
+
+def testReductions():
+    """Use this function to test that reductions given by variable or by function are evaluated on a level of a node."""
+    solver = pysweep.Solver(sendWarning=False)
+    solver.arrayShape = (11,2,4,4)
+    solver.reductions = {"mean":["mean",1],"peak":(lambda level:level[0].max(),"max")}
+    level = numpy.arange(32,dtype=float).reshape(2,4,4)
+    values = {name:function(level)*scale for name,function,operation,scale in pysweep.core.io.getReductions(solver)}
+    assert values == {"mean":numpy.mean(level[1]),"peak":15}
+
 def setupSolver(solver,filename,cpu,gpu,ops,its):
     """Use this function to set up solvers for various tests."""
     warnings.filterwarnings('ignore') #Ignore warnings for processes
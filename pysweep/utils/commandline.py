@@ -49,9 +49,27 @@ def runEuler(args):
     solver.operating = 2
     solver.intermediate = 2
     solver.share = args.share
+    solver.threads = args.threads
+    solver.overlap = args.overlap
+    solver.asyncWrite = args.async_write
+    solver.collectiveWrite = args.collective_write
+    solver.chunks = args.chunks
+    solver.compression = args.compression
+    solver.writeStride = args.write_stride
+    solver.checkpointInterval = args.checkpoint_interval
+    solver.restart = args.restart
+    solver.shardedOutput = args.sharded_output
+    solver.reductions = {"{}{}".format(operation,variable):[operation,int(variable)] for operation,variable in args.reduction}
+    solver.probes = args.probe
+    solver.nodeGrid = args.node_grid
+    solver.calibrate = args.calibrate
+    solver.autotune = args.autotune
+    solver.blockOrder = args.block_order
+    solver.workStealing = args.work_stealing
+    solver.logFile = args.log_file
     solver.simulation = True if args.swept else False
     solver.blocksize = (args.blocksize,args.blocksize,1)
-    solver.setCPU(getEqnPath("euler.py"))
+    solver.setCPU(getEqnPath("eulerJIT.py" if args.jit else "euler.py"))
     solver.setGPU(getEqnPath("euler.cu"))
     solver.exid = []
     solver.output = "eulerOutput.hdf5"
@@ -93,9 +111,27 @@ def runHeat(args):
     solver.operating = 1
     solver.intermediate = 1
     solver.share = args.share
+    solver.threads = args.threads
+    solver.overlap = args.overlap
+    solver.asyncWrite = args.async_write
+    solver.collectiveWrite = args.collective_write
+    solver.chunks = args.chunks
+    solver.compression = args.compression
+    solver.writeStride = args.write_stride
+    solver.checkpointInterval = args.checkpoint_interval
+    solver.restart = args.restart
+    solver.shardedOutput = args.sharded_output
+    solver.reductions = {"{}{}".format(operation,variable):[operation,int(variable)] for operation,variable in args.reduction}
+    solver.probes = args.probe
+    solver.nodeGrid = args.node_grid
+    solver.calibrate = args.calibrate
+    solver.autotune = args.autotune
+    solver.blockOrder = args.block_order
+    solver.workStealing = args.work_stealing
+    solver.logFile = args.log_file
     solver.simulation = True if args.swept else False
     solver.blocksize = (args.blocksize,args.blocksize,1)
-    solver.setCPU(getEqnPath("heat.py"))
+    solver.setCPU(getEqnPath("heatJIT.py" if args.jit else "heat.py"))
     solver.setGPU(getEqnPath("heat.cu"))
     solver.exid = []
     solver.output = "heatOutput.hdf5"
@@ -127,6 +163,25 @@ def commandLine():
     parser.add_argument("-s","--share",default=0.5,nargs="?",type=float,help="This specifies the GPU share, a value from 0 to 1.")
     parser.add_argument('--clean', action='store_true', help="Clean up any file not necessary to performance testing including results.")
     parser.add_argument('--ignore', action='store_true', help="Ignore warnings with this option.")
+    parser.add_argument("-t","--threads",default=1,nargs="?",type=int,help="This specifies the number of threads each cpu rank uses to solve its blocks.")
+    parser.add_argument('--overlap', action='store_true', help="Solve interior blocks while halos are exchanged in the standard solver.")
+    parser.add_argument('--async-write', action='store_true', help="Write output from a background thread on node masters.")
+    parser.add_argument('--collective-write', action='store_true', help="Write output from all ranks with collective MPI-IO.")
+    parser.add_argument("--chunks",default=None,choices=["block","slab"],type=str,help="This specifies the chunk layout of the output dataset.")
+    parser.add_argument("--compression",default=None,choices=["gzip","lzf"],type=str,help="This specifies the compression filter of the output dataset, it implies chunking and collective writes in parallel.")
+    parser.add_argument("--write-stride",default=1,nargs="?",type=int,help="This specifies that every nth time level is written to the output file, 0 writes none.")
+    parser.add_argument("--checkpoint-interval",default=0,nargs="?",type=int,help="This specifies the swept cycles or standard steps between checkpoints, 0 disables checkpoints.")
+    parser.add_argument('--sharded-output', action='store_true', help="Write the output of each node to its own file joined by a virtual dataset.")
+    parser.add_argument('--restart', action='store_true', help="Continue the run from its checkpoint file.")
+    parser.add_argument("--reduction",nargs=2,action="append",default=list(),metavar=("OPERATION","VARIABLE"),help="This adds a reduction (sum, min, max, or mean) of a variable recorded every time level, it may be repeated.")
+    parser.add_argument("--probe",nargs=2,action="append",default=list(),type=int,metavar=("X","Y"),help="This adds a point whose variables are recorded every time level, it may be repeated.")
+    parser.add_argument("--node-grid",nargs=2,default=None,type=int,metavar=("XNODES","YNODES"),help="This specifies the grid of nodes in x and y, it is chosen from the number of nodes and the domain by default.")
+    parser.add_argument("--calibrate",action="store_true",help="This splits rows in proportion to the measured speed of each node, speeds are cached per hostname.")
+    parser.add_argument("--block-order",default="column",choices=["column","morton","hilbert"],type=str,help="This specifies the order of the blocks split across the ranks of a node.")
+    parser.add_argument("--work-stealing",action="store_true",help="This makes the ranks of a node claim cpu blocks from a shared counter in every phase instead of solving fixed blocks.")
+    parser.add_argument("--autotune",action="store_true",help="This chooses the fastest simulation type and blocksize from short trial runs, choices are cached per equation, shape, ranks, and hosts.")
+    parser.add_argument("--log-file",default="log.db",nargs="?",type=str,help="This specifies the run log database the run is appended to.")
+    parser.add_argument('--jit', action='store_true', help="Use the numba compiled cpu module of the example (requires numba).")
     parser.add_argument('-v','--verbose', action='store_true', help="Enable verbose simulation.")
     #Command line args for figure creation
     figureMap = {"up":figures.Up1,'y1':figures.Y1,'c1':figures.Comm1,'x1':figures.X1,'oct':figures.Oct1,'y2':figures.Y2,'c2':figures.Comm2,'x2':figures.X2,'down':figures.DWP1,"all":figures.createAll}
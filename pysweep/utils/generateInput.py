@@ -1,4 +1,5 @@
-import os,sys,yaml,errno,traceback
+import os,sys,yaml,errno,traceback,numpy,h5py
+import mpi4py.MPI as MPI
 
 pysweepPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 equationPath = os.path.join(pysweepPath,"equations")
@@ -30,4 +31,30 @@ def generateInputFile(name):
             if ".cu" in file:
                 yamlOutput["gpu"] = os.path.join(equationPath,file)
     with open("{}.yaml".format(name),"w") as f:
-        yaml.dump(yamlOutput,f)
\ No newline at end of file
+        yaml.dump(yamlOutput,f)
+
+
+def generateInitialConditions(function,nv,npx,npy,xRange=(0,1),yRange=(0,1),filename="initialConditions.hdf5",dtype=numpy.float64,blockRows=None):
+    """Use this function to create a set of initial conditions in an hdf5 file in parallel from a vectorized function.
+    args:
+    function: f(X,Y) which returns nv arrays (or one array for all variables) of values at the points X,Y
+    nv: number of variables
+    npx: number of points in x
+    npy: number of points in y
+    xRange, yRange: bounds of the domain, points are spaced evenly without the upper bound
+    blockRows: rows evaluated and written at once, by default blocks of about 4 million points
+    Every rank evaluates blocks of its own rows and writes them as contiguous hyperslabs.
+    """
+    comm = MPI.COMM_WORLD
+    X = numpy.linspace(*xRange,npx,endpoint=False)
+    Y = numpy.linspace(*yRange,npy,endpoint=False)
+    rows = numpy.array_split(numpy.arange(npx),comm.Get_size())[comm.Get_rank()]
+    blockRows = max(1,2**22//(nv*npy)) if blockRows is None else blockRows
+    with h5py.File(filename,"w",driver="mpio",comm=comm) as hf:
+        initialConditions = hf.create_dataset("data",(nv,npx,npy),dtype=dtype)
+        for start in range(int(rows[0]) if rows.size else 0,int(rows[-1])+1 if rows.size else 0,blockRows):
+            stop = min(start+blockRows,int(rows[-1])+1)
+            XB,YB = numpy.meshgrid(X[start:stop],Y,indexing="ij")
+            initialConditions[:,start:stop,:] = numpy.broadcast_to(numpy.asarray(function(XB,YB),dtype=dtype),(nv,stop-start,npy))
+    comm.Barrier()
+    return filename
@@ -27,5 +27,6 @@ setuptools.setup(
         "Operating System :: OS Independent",
     ],
     python_requires='>=3.6',
-    install_requires=['pytest','h5py','matplotlib']
+    install_requires=['pytest','h5py','matplotlib'],
+    extras_require={'jit':['numba']}
 )
@@ -0,0 +1,126 @@
+#Programmer: Anthony Walker
+#This file contains single process benchmarks of the swept engine that do not require MPI communication or GPUs
+import time, numpy
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+import pysweep.core.geometry as geometry
+import pysweep.core.block as block
+import pysweep.core.process as process
+import pysweep.equations.example as example
+import pysweep.equations.euler as euler
+
+def makeSweptBlocks(sharedShape,blocksize):
+    """Use this function to create cpu blocks and edge blocks covering a node shared array."""
+    timeSlice = slice(0,sharedShape[0],1)
+    variableSlice = slice(0,sharedShape[1],1)
+    blocks = list()
+    for j in range(0,sharedShape[3],blocksize):
+        for i in range(0,sharedShape[2],blocksize):
+            blocks.append((timeSlice,variableSlice,slice(i,i+blocksize,1),slice(j,j+blocksize,1)))
+    edgeblocks = block.makeEdgeBlocksSwept(blocks,sharedShape,(blocksize,blocksize,1))
+    return blocks,edgeblocks
+
+def copiedBytes(phase,blocks):
+    """Use this function to get the bytes a phase copies in and out of the shared array for the given blocks."""
+    return sum(2*phase.CPUArray.nbytes for currBlock in blocks if not (phase.inPlace and geometry.isSliceBlock(currBlock)))
+
+def benchmarkInPlace(npx=384,blocksize=16,operating=1,intermediate=1,cycles=10):
+    """Use this function to compare the memory traffic and time of a swept cycle (XBridge, Octahedron, YBridge) with and without in place execution."""
+    example.set_globals(0,1,0.1,0.1,0.1,True)
+    MPSS = blocksize//(2*operating)-1
+    sharedShape = (2*MPSS+intermediate,1,npx,npx)
+    sharedArray = numpy.zeros(sharedShape)
+    blocks,edgeblocks = makeSweptBlocks(sharedShape,blocksize)
+    up_sets,down_sets,oct_sets,y_sets,x_sets = block.createSweptSets((blocksize,blocksize,1),operating,MPSS)
+    cshape = sharedArray[blocks[0]].shape
+    print("Swept cycle benchmark: array {}, blocksize {}, {} blocks".format(sharedShape,blocksize,len(blocks)))
+    for inPlace in (False,True):
+        phases = [geometry.Geometry() for i in range(3)]
+        for phase,sets in zip(phases,(x_sets,oct_sets,y_sets)):
+            phase.initializeCPU(example,sets,intermediate-1,cshape)
+            phase.setInPlace(inPlace)
+        Xb,Oct,Yb = phases
+        traffic = copiedBytes(Xb,blocks)+copiedBytes(Oct,edgeblocks)+copiedBytes(Yb,blocks)
+        start = time.perf_counter()
+        for i in range(cycles):
+            Xb.callCPU(sharedArray,blocks,1)
+            Oct.callCPU(sharedArray,edgeblocks,1)
+            Yb.callCPU(sharedArray,blocks,1)
+        elapsed = (time.perf_counter()-start)/cycles
+        print("\tin place: {}, copied MB per cycle: {:0.3f}, seconds per cycle: {:0.5f}".format(inPlace,traffic/1e6,elapsed))
+
+def benchmarkThreads(npx=768,blocksize=32,threads=(1,2,4),cycles=5):
+    """Use this function to compare the time of a swept cycle of the euler equations solved with thread pools of different sizes."""
+    euler.set_globals(0,1,0.01,10/npx,10/npx,1.4)
+    operating,intermediate = 2,2
+    MPSS = blocksize//(2*operating)-1
+    sharedShape = (2*MPSS+intermediate,4,npx,npx)
+    sharedArray = numpy.zeros(sharedShape)
+    sharedArray[:] = euler.getAnalyticalArray(npx,npx,0)
+    blocks,edgeblocks = makeSweptBlocks(sharedShape,blocksize)
+    up_sets,down_sets,oct_sets,y_sets,x_sets = block.createSweptSets((blocksize,blocksize,1),operating,MPSS)
+    cshape = sharedArray[blocks[0]].shape
+    print("Threaded swept cycle benchmark: array {}, blocksize {}, {} blocks".format(sharedShape,blocksize,len(blocks)))
+    for nthreads in threads:
+        pool = ThreadPoolExecutor(max_workers=nthreads) if nthreads > 1 else None
+        phases = [geometry.Geometry() for i in range(3)]
+        for phase,sets in zip(phases,(x_sets,oct_sets,y_sets)):
+            phase.initializeCPU(euler,sets,intermediate-1,cshape)
+            phase.setPool(pool)
+        Xb,Oct,Yb = phases
+        start = time.perf_counter()
+        for i in range(cycles):
+            Xb.callCPU(sharedArray,blocks,1)
+            Oct.callCPU(sharedArray,edgeblocks,1)
+            Yb.callCPU(sharedArray,blocks,1)
+        elapsed = (time.perf_counter()-start)/cycles
+        if pool is not None:
+            pool.shutdown()
+        print("\tthreads: {}, seconds per cycle: {:0.5f}".format(nthreads,elapsed))
+
+def getRankPatches(npx,blocksize,ranks,blockOrder):
+    """Use this function to get the (row,column) indices of the blocks each rank of a node owns when blocks are split in the given order."""
+    indices = process.getBlockOrder(SimpleNamespace(blockOrder=blockOrder),npx//blocksize,npx//blocksize)
+    return [[tuple(index) for index in patch] for patch in numpy.array_split(indices,ranks)]
+
+def getHaloFaces(patch):
+    """Use this function to get the number of block faces of a patch shared with blocks of other ranks or the node edges."""
+    owned = set(patch)
+    return sum((i+di,j+dj) not in owned for i,j in patch for di,dj in ((1,0),(-1,0),(0,1),(0,-1)))
+
+def benchmarkBlockOrder(npx=1024,blocksize=16,ranks=8,cycles=5):
+    """Use this function to compare the locality of the block patches of the ranks of a node and the time of a swept cycle they solve for each block order.
+    Ranks are solved one after another so each rank works through its own patch as it would in its process.
+    """
+    example.set_globals(0,1,0.1,0.1,0.1,True)
+    operating,intermediate = 1,1
+    MPSS = blocksize//(2*operating)-1
+    sharedShape = (2*MPSS+intermediate,1,npx,npx)
+    sharedArray = numpy.random.rand(*sharedShape)
+    up_sets,down_sets,oct_sets,y_sets,x_sets = block.createSweptSets((blocksize,blocksize,1),operating,MPSS)
+    timeSlice,variableSlice = slice(0,sharedShape[0],1),slice(0,sharedShape[1],1)
+    print("Block order benchmark: array {}, blocksize {}, {} ranks".format(sharedShape,blocksize,ranks))
+    for blockOrder in ("column","morton","hilbert"):
+        patches = getRankPatches(npx,blocksize,ranks,blockOrder)
+        rankBlocks = [[(timeSlice,variableSlice,slice(i*blocksize,(i+1)*blocksize,1),slice(j*blocksize,(j+1)*blocksize,1)) for i,j in patch] for patch in patches]
+        rankEdges = [block.makeEdgeBlocksSwept(blocks,sharedShape,(blocksize,blocksize,1)) for blocks in rankBlocks]
+        phases = [geometry.Geometry() for i in range(3)]
+        for phase,sets in zip(phases,(x_sets,oct_sets,y_sets)):
+            phase.initializeCPU(example,sets,intermediate-1,sharedArray[rankBlocks[0][0]].shape)
+        Xb,Oct,Yb = phases
+        start = time.perf_counter()
+        for i in range(cycles):
+            for blocks,edgeblocks in zip(rankBlocks,rankEdges):
+                Xb.callCPU(sharedArray,blocks,1)
+                Oct.callCPU(sharedArray,edgeblocks,1)
+                Yb.callCPU(sharedArray,blocks,1)
+        elapsed = (time.perf_counter()-start)/cycles
+        haloFaces = numpy.mean([getHaloFaces(patch) for patch in patches])
+        spans = numpy.mean([(max(i for i,j in patch)-min(i for i,j in patch)+1)*(max(j for i,j in patch)-min(j for i,j in patch)+1) for patch in patches])
+        wrapped = max(sum(not geometry.isSliceBlock(edge) for edge in edgeblocks) for edgeblocks in rankEdges)
+        print("\torder: {}, halo faces per rank: {:0.1f}, bounding blocks per rank: {:0.1f}, most wrapped edge blocks on a rank: {}, seconds per cycle: {:0.5f}".format(blockOrder,haloFaces,spans,wrapped,elapsed))
+
+if __name__ == "__main__":
+    benchmarkInPlace()
+    benchmarkThreads()
+    benchmarkBlockOrder()
@@ -1,4 +1,4 @@
-import numpy, yaml, pysweep, itertools, h5py, math
+import numpy, yaml, pysweep, itertools, h5py, math, os
 import pysweep.utils.validate as validate
 import matplotlib.pyplot as plt
 from matplotlib import ticker
@@ -196,28 +196,19 @@ def generateArraySizes():
     return arraysizes
 
 def getYamlData(file,equation):
-    document = open(file,'r')
-    yamlFile = yaml.load(document,Loader=yaml.FullLoader)
-    data = []
-    for key in yamlFile:
-        if equation in yamlFile[key]['cpu']:
-            swept = 1 if yamlFile[key]['swept'] else 0
-            data.append([float(swept),float(yamlFile[key]['array_shape'][2]),float(yamlFile[key]['blocksize']),float(yamlFile[key]['share']),float(yamlFile[key]['runtime']),float(yamlFile[key]['time_per_step'])])
-    i = 0
-    while i < len(data):
-        j = i+1
-        while j < len(data):
-            if data[i][:4] == data[j][:4]: 
-                data.pop(j)
-            j+=1
-        i+=1
+    """Use this function to get the unique runs of an equation from a log.yaml file, the file is imported into a run log next to it once and again whenever it changes."""
+    logFile = os.path.splitext(file)[0]+".db"
+    if os.path.isfile(logFile) and os.path.getmtime(file) > os.path.getmtime(logFile):
+        os.remove(logFile) #The run log only holds the yaml runs, so it is rebuilt instead of appended to
+    if not os.path.isfile(logFile):
+        pysweep.core.io.importLogFile(file,logFile)
+    return getLogData(logFile,equation)
 
-    data = numpy.array(data,)
-    indexes = numpy.lexsort((data[:,3],data[:,2],data[:,1],data[:,0]))
-    sortedData = numpy.zeros(data.shape)
-    for i,idx in enumerate(indexes):
-        sortedData[i,:] = data[idx,:] 
-    return sortedData,standardSizes
+def getLogData(file,equation):
+    """Use this function to get the unique runs of an equation from a run log sorted by swept, array size, blocksize, and share."""
+    rows = pysweep.core.io.queryLogFile(file,equation=equation,unique=True)
+    data = numpy.array([[float(row['swept']),float(row['nx']),float(row['blocksize']),float(row['share']),float(row['runtime']),float(row['time_per_step'])] for row in rows])
+    return data,standardSizes
 
 def checkForAllPts(sortedData):
     ct = 0